@@ -0,0 +1,20 @@
+import { io } from 'socket.io-client'
+
+let socket = null
+
+// one connection per tab, shared by every component that listens for realtime events
+export function getSocket() {
+  if (socket) return socket
+
+  let host = window.location.origin
+  if (window.dev_server) {
+    // socket.io listens on its own port in development, production proxies it
+    host = `${window.location.protocol}//${window.location.hostname}:${window.socketio_port}`
+  }
+
+  // keeps retrying for as long as the tab is open (e.g. across a deploy), nothing else polls
+  socket = io(`${host}/${window.site_name}`, {
+    withCredentials: true,
+  })
+  return socket
+}
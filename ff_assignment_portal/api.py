@@ -1,12 +1,38 @@
 import frappe
 
 from mimetypes import guess_type
-from frappe.utils import cint
+from frappe.query_builder import CustomFunction, Order
+from frappe.query_builder.functions import Substring
+from frappe.utils import cint, strip_html
+
+from ff_assignment_portal import conditional, notifications, realtime, similarity
+from ff_assignment_portal.ff_assignment_portal.report.ff_assignment_summary_by_student import (
+	ff_assignment_summary_by_student as summary_report,
+)
+from ff_assignment_portal.rate_limit import rate_limit
+from ff_assignment_portal.sql_portal import leaderboard
+
+ASSIGNMENT_DOCTYPE_NAME = "FF Assignment Submission"
+CHECK_RESULT_STATUSES = ("Passed", "Failed")
+HISTORY_PAGE_LENGTH = 20
+MAX_HISTORY_PAGE_LENGTH = 100
+FEEDBACK_EXCERPT_LENGTH = 200
+# only this much of the feedback is read to make an excerpt, markup included
+FEEDBACK_HEAD_LENGTH = 2000
+
+# LENGTH counts bytes on MariaDB, the excerpt is measured in characters
+CharLength = CustomFunction("CHAR_LENGTH", ["string"])
 
 
 @frappe.whitelist()
 def get_assignments_summary():
 	"""Returns passed/failed for current user and each day"""
+	return conditional.conditional_response(
+		conditional.assignments_summary(frappe.session.user), build_assignments_summary
+	)
+
+
+def build_assignments_summary():
 	summary = {}
 	for day in range(1, 4):
 		summary[f"day-{day}"] = has_passed_assignment(day)
@@ -28,6 +54,80 @@ def has_passed_assignment(day):
 
 
 @frappe.whitelist()
+def get_submission_history(day, cursor=None, page_length=HISTORY_PAGE_LENGTH):
+	"""Returns a page of the current user's submissions for `day`, newest first, without the full feedback.
+
+	Pages are keyset-paginated on (creation, name): pass the `next_cursor` of a page as `cursor`
+	to get the one after it. `get_submission_feedback` returns a submission's full feedback.
+	"""
+	page_length = max(1, min(cint(page_length) or HISTORY_PAGE_LENGTH, MAX_HISTORY_PAGE_LENGTH))
+
+	Submission = frappe.qb.DocType(ASSIGNMENT_DOCTYPE_NAME)
+	query = (
+		frappe.qb.from_(Submission)
+		.select(
+			Submission.name,
+			Submission.status,
+			Submission.creation,
+			Submission.submission_summary,
+			Substring(Submission.feedback, 1, FEEDBACK_HEAD_LENGTH).as_("feedback_head"),
+			CharLength(Submission.feedback).as_("feedback_length"),
+		)
+		.where((Submission.user == frappe.session.user) & (Submission.day == day))
+		.orderby(Submission.creation, order=Order.desc)
+		.orderby(Submission.name, order=Order.desc)
+		# one more than asked for, to know whether there is a next page
+		.limit(page_length + 1)
+	)
+
+	if cursor:
+		cursor = frappe.parse_json(cursor)
+		# the `creation <=` bound lets the user_day_creation_index range scan start at the cursor
+		query = query.where(
+			(Submission.creation <= cursor["creation"])
+			& ((Submission.creation < cursor["creation"]) | (Submission.name < cursor["name"]))
+		)
+
+	submissions = query.run(as_dict=True)
+
+	next_cursor = None
+	if len(submissions) > page_length:
+		submissions = submissions[:page_length]
+		next_cursor = {"creation": submissions[-1].creation, "name": submissions[-1].name}
+
+	for submission in submissions:
+		submission.feedback_excerpt = get_feedback_excerpt(submission.pop("feedback_head"))
+		submission.feedback_length = submission.feedback_length or 0
+
+	return {"submissions": submissions, "next_cursor": next_cursor}
+
+
+@frappe.whitelist()
+def get_submission_feedback(name):
+	"""Returns the full feedback of one of the current user's submissions"""
+	submission = frappe.db.get_value(
+		ASSIGNMENT_DOCTYPE_NAME,
+		{"name": name, "user": frappe.session.user},
+		["name", "feedback"],
+		as_dict=True,
+	)
+	if not submission:
+		raise frappe.DoesNotExistError(f"Submission {name} not found")
+
+	return submission
+
+
+def get_feedback_excerpt(feedback: str | None) -> str:
+	# problems are separated by <br/>, keep them apart once the tags are gone
+	text = " ".join(strip_html((feedback or "").replace("<br", " <br")).split())
+	if len(text) > FEEDBACK_EXCERPT_LENGTH:
+		return text[: FEEDBACK_EXCERPT_LENGTH - 1].rstrip() + "…"
+
+	return text
+
+
+@frappe.whitelist()
+@rate_limit(rate=0.2, burst=5)
 def upload_assignment_submission():
 	"""Handles zip file upload for assignment submission"""
 	files = frappe.request.files
@@ -73,28 +173,67 @@ def upload_assignment_submission():
 
 @frappe.whitelist()
 def get_solution_status(problem):
+	return conditional.conditional_response(
+		conditional.solution_status(frappe.session.user, problem),
+		lambda: build_solution_status(problem),
+	)
+
+
+def build_solution_status(problem):
 	current_user = frappe.session.user
-	already_attempted = frappe.db.exists(
-		"SQL Problem Solution", {"problem": problem, "student": current_user}
+	attempt = frappe.db.get_value(
+		"SQL Problem Solution",
+		{"problem": problem, "student": current_user},
+		["status", "last_submitted_query", "feedback"],
+		as_dict=True,
 	)
 
 	summary = frappe._dict({"status": "Not Attempted"})
 
-	if already_attempted:
-		attempt_name = already_attempted
-		status, last_submitted_query, feedback = frappe.db.get_value(
-			"SQL Problem Solution",
-			attempt_name,
-			["status", "last_submitted_query", "feedback"],
-		)
-		summary.status = status
-		summary.last_submitted_query = last_submitted_query
-		summary.feedback = feedback
+	if attempt:
+		summary.status = attempt.status
+		summary.last_submitted_query = attempt.last_submitted_query
+		summary.feedback = attempt.feedback
 
 	return summary
 
 
 @frappe.whitelist()
+def get_problem_set(name):
+	"""Returns the introduction and problems of a problem set, in the set's order"""
+	frappe.has_permission("SQL Problem Set", "read", throw=True)
+	return conditional.conditional_response(
+		conditional.problem_set(name), lambda: build_problem_set(name)
+	)
+
+
+def build_problem_set(name):
+	problem_set = frappe.get_doc("SQL Problem Set", name)
+	problem_set.check_permission("read")
+
+	problem_names = [row.problem for row in problem_set.problems]
+	statements = {
+		problem.name: problem.problem_statement
+		for problem in frappe.get_list(
+			"SQL Problem",
+			filters={"name": ("in", problem_names)},
+			fields=["name", "problem_statement"],
+		)
+	}
+
+	return {
+		"name": problem_set.name,
+		"introduction": problem_set.introduction,
+		"problems": [
+			{"name": problem, "problem_statement": statements[problem]}
+			for problem in problem_names
+			if problem in statements
+		],
+	}
+
+
+@frappe.whitelist()
+@rate_limit(rate=0.5, burst=10)
 def submit_sql_solution(problem, solution):
 	current_user = frappe.session.user
 	already_attempted = frappe.db.exists(
@@ -110,6 +249,93 @@ def submit_sql_solution(problem, solution):
 		solution_doc.problem = problem
 
 	solution_doc.last_submitted_query = solution
-	solution_doc.save(ignore_permissions=True)
+	solution_doc.attempts = (solution_doc.attempts or 0) + 1
+
+	try:
+		solution_doc.save(ignore_permissions=True)
+	except frappe.UniqueValidationError:
+		# a concurrent request created this student's attempt first, update that one instead
+		solution_doc = frappe.get_doc(
+			"SQL Problem Solution", {"problem": problem, "student": current_user}
+		)
+		solution_doc.last_submitted_query = solution
+		solution_doc.attempts = (solution_doc.attempts or 0) + 1
+		solution_doc.save(ignore_permissions=True)
 
 	return solution_doc
+
+
+@frappe.whitelist()
+def get_sql_leaderboard(problem_set, limit=leaderboard.DEFAULT_TOP):
+	"""Top students of a problem set and the current user's standing, polled by live dashboards"""
+	frappe.has_permission("SQL Problem Set", "read", throw=True)
+	limit = min(cint(limit) or leaderboard.DEFAULT_TOP, leaderboard.MAX_TOP)
+	board = leaderboard.get_leaderboard(problem_set, frappe.session.user, limit)
+
+	# classmates see each other's names, never anything taken from their email addresses
+	for row in board.top:
+		row.is_me = row.pop("student") == frappe.session.user
+		row.full_name = row.full_name or frappe._("Student {0}").format(row.rank)
+
+	return board
+
+
+@frappe.whitelist(methods=["POST"])
+def ingest_check_results(results):
+	"""Applies a batch of results from the external day 2 / day 3 checker in one transaction.
+
+	`results` is a list of `{"submission": ..., "status": "Passed" | "Failed", "feedback": ...}`.
+	Results that are already applied are skipped, so replaying a batch is harmless.
+	"""
+	frappe.only_for("System Manager")
+
+	results = frappe.parse_json(results)
+	for result in results:
+		if result.get("status") not in CHECK_RESULT_STATUSES:
+			frappe.throw(
+				f"Invalid status {frappe.bold(result.get('status'))} for {result.get('submission')}, "
+				f"expected one of {', '.join(CHECK_RESULT_STATUSES)}."
+			)
+
+	current = {
+		row.name: row
+		for row in frappe.get_all(
+			ASSIGNMENT_DOCTYPE_NAME,
+			filters={"name": ("in", [result.get("submission") for result in results])},
+			fields=["name", "user", "day", "status", "feedback", "hashes"],
+		)
+	}
+
+	updates = {}
+	not_found = []
+	for result in results:
+		name = result.get("submission")
+		if name not in current:
+			not_found.append(name)
+			continue
+
+		row = current[name]
+		feedback = result.get("feedback") or ""
+		if row.status == result["status"] and (row.feedback or "") == feedback:
+			continue
+
+		updates[name] = {"status": result["status"], "feedback": feedback}
+
+	if updates:
+		frappe.db.bulk_update(ASSIGNMENT_DOCTYPE_NAME, updates)
+		summary_report.mark_dirty(*{current[name].user for name in updates})
+
+		for name in updates:
+			row = current[name]
+			conditional.bump(conditional.assignments_summary(row.user))
+			if notifications.should_notify(row.day):
+				notifications.queue_after_commit(row.user, name)
+			if row.day != "4" and row.status != "Passed" and updates[name]["status"] == "Passed":
+				similarity.add_after_commit(name, row.user, row.day, row.hashes)
+			realtime.publish_submission_update(row.user, {"name": name, "day": row.day, **updates[name]})
+
+	return {
+		"updated": len(updates),
+		"unchanged": len(results) - len(updates) - len(not_found),
+		"not_found": not_found,
+	}
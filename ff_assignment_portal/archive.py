@@ -0,0 +1,94 @@
+"""Guarded reading of uploaded zip archives.
+
+Every limit is checked against the central directory before a single member is
+decompressed, and members are then read in bounded chunks, so a crafted upload (zip bomb,
+millions of entries, lying headers) is rejected without exhausting memory or CPU.
+"""
+
+import zipfile
+import zlib
+
+import frappe
+
+RELEVANT_EXTENSIONS = (".json", ".py", ".html", ".js")
+IGNORED_PATTERNS = ("__MACOSX", ".DS_Store")
+
+MAX_MEMBERS = 1000
+MAX_MEMBER_SIZE = 5 * 1024 * 1024
+MAX_TOTAL_SIZE = 25 * 1024 * 1024
+MAX_COMPRESSION_RATIO = 100
+# tiny members can have absurd ratios (a file full of spaces) without being a threat
+RATIO_CHECK_MIN_SIZE = 64 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def iter_members(path: str, extensions=RELEVANT_EXTENSIONS):
+	"""Yields (member name, content) for members ending with `extensions`, ignoring the rest."""
+	try:
+		zip_file = zipfile.ZipFile(path)
+	except zipfile.BadZipFile:
+		frappe.throw("The uploaded file is not a valid zip file.")
+
+	with zip_file:
+		members = [info for info in zip_file.infolist() if is_relevant(info, extensions)]
+		validate_limits(zip_file, members)
+
+		for info in members:
+			yield info.filename, read_member(zip_file, info)
+
+
+def is_relevant(info: zipfile.ZipInfo, extensions) -> bool:
+	if info.is_dir():
+		return False
+
+	if any(pattern in info.filename for pattern in IGNORED_PATTERNS):
+		return False
+
+	return extensions is None or info.filename.endswith(extensions)
+
+
+def validate_limits(zip_file: zipfile.ZipFile, members: list[zipfile.ZipInfo]):
+	num_entries = len(zip_file.infolist())
+	if num_entries > MAX_MEMBERS:
+		frappe.throw(f"The zip file contains too many files ({num_entries}), the limit is {MAX_MEMBERS}.")
+
+	total_size = 0
+	for info in members:
+		if info.file_size > MAX_MEMBER_SIZE:
+			frappe.throw(
+				f"{frappe.bold(info.filename)} is too large ({frappe.utils.pretty_size(info.file_size)}), "
+				f"the limit per file is {frappe.utils.pretty_size(MAX_MEMBER_SIZE)}."
+			)
+
+		if (
+			info.file_size > RATIO_CHECK_MIN_SIZE
+			and info.file_size > info.compress_size * MAX_COMPRESSION_RATIO
+		):
+			frappe.throw(f"{frappe.bold(info.filename)} is compressed suspiciously well, please re-create the zip.")
+
+		total_size += info.file_size
+
+	if total_size > MAX_TOTAL_SIZE:
+		frappe.throw(
+			f"The files in the zip add up to {frappe.utils.pretty_size(total_size)}, "
+			f"the limit is {frappe.utils.pretty_size(MAX_TOTAL_SIZE)}."
+		)
+
+
+def read_member(zip_file: zipfile.ZipFile, info: zipfile.ZipInfo) -> bytes:
+	# the declared size was checked already, but headers can lie about it
+	limit = min(info.file_size, MAX_MEMBER_SIZE)
+	chunks = []
+	size = 0
+
+	try:
+		with zip_file.open(info) as member:
+			while chunk := member.read(READ_CHUNK_SIZE):
+				size += len(chunk)
+				if size > limit:
+					frappe.throw(f"{frappe.bold(info.filename)} is larger than the zip file claims.")
+				chunks.append(chunk)
+	except (zipfile.BadZipFile, zlib.error):
+		frappe.throw(f"{frappe.bold(info.filename)} is corrupted, please re-create the zip.")
+
+	return b"".join(chunks)
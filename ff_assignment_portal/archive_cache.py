@@ -0,0 +1,119 @@
+"""On-disk cache of extracted and parsed submission archives.
+
+Entries are keyed by the zip's content hash and hold the members exactly as the checks see
+them (JSON already parsed), so every consumer after the first (checks, file hashes,
+similarity, mentor reviews, background jobs) skips decompression altogether. The cache lives
+in the site directory and is shared by all workers on a host: entries are written to a
+temporary file and atomically renamed into place, and the least recently read entries are
+evicted once the cache grows beyond its size limit.
+"""
+
+import json
+import os
+import tempfile
+from contextlib import suppress
+
+import frappe
+
+from ff_assignment_portal import metrics
+
+# bump whenever the shape of the parsed members changes
+CACHE_VERSION = 1
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+ENTRY_SUFFIX = ".json"
+
+
+def get_members(content_hash: str | None, extract) -> list[tuple[str, str | dict]]:
+	"""Returns the cached members for `content_hash`, calling `extract` to fill the cache on a miss."""
+	if not content_hash:
+		return extract()
+
+	path = get_entry_path(content_hash)
+	members = read_entry(path)
+	if members is not None:
+		metrics.inc("ff_archive_cache_lookups_total", result="hit")
+		return members
+
+	metrics.inc("ff_archive_cache_lookups_total", result="miss")
+	members = extract()
+	write_entry(path, members)
+	evict()
+	return members
+
+
+def read_entry(path: str) -> list[tuple[str, str | dict]] | None:
+	try:
+		with open(path) as f:
+			members = json.load(f)
+	except (FileNotFoundError, json.JSONDecodeError):
+		return None
+
+	# the modification time doubles as the last access time for eviction
+	with suppress(FileNotFoundError):
+		os.utime(path)
+
+	return [tuple(member) for member in members]
+
+
+def write_entry(path: str, members: list):
+	cache_dir = os.path.dirname(path)
+	fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+	try:
+		with os.fdopen(fd, "w") as f:
+			json.dump(members, f)
+		os.replace(tmp_path, path)
+	except BaseException:
+		with suppress(FileNotFoundError):
+			os.unlink(tmp_path)
+		raise
+
+
+def evict():
+	"""Removes the least recently read entries until the cache fits in its size limit."""
+	entries = []
+	total_size = 0
+
+	for entry in os.scandir(get_cache_dir()):
+		if not entry.name.endswith(ENTRY_SUFFIX):
+			continue
+		try:
+			stat = entry.stat()
+		except FileNotFoundError:
+			# evicted by another worker meanwhile
+			continue
+		entries.append((stat.st_mtime, stat.st_size, entry.path))
+		total_size += stat.st_size
+
+	max_size = get_max_size()
+	if total_size <= max_size:
+		return
+
+	for _, size, path in sorted(entries):
+		with suppress(FileNotFoundError):
+			os.unlink(path)
+		total_size -= size
+		if total_size <= max_size:
+			break
+
+
+def clear():
+	for entry in os.scandir(get_cache_dir()):
+		with suppress(FileNotFoundError):
+			os.unlink(entry.path)
+
+
+def get_entry_path(content_hash: str) -> str:
+	return os.path.join(get_cache_dir(), f"v{CACHE_VERSION}-{content_hash}{ENTRY_SUFFIX}")
+
+
+def get_cache_dir() -> str:
+	cache_dir = frappe.get_site_path("archive_cache")
+	os.makedirs(cache_dir, exist_ok=True)
+	return cache_dir
+
+
+def get_max_size() -> int:
+	"""Size limit in bytes, configurable in MB with `ff_archive_cache_size` in site config"""
+	if size := frappe.conf.get("ff_archive_cache_size"):
+		return int(size) * 1024 * 1024
+	return DEFAULT_MAX_SIZE
@@ -0,0 +1,225 @@
+"""Benchmarks for the checking and grading hot paths.
+
+Run them against a development site with:
+
+	bench --site <site> run-portal-benchmarks [--cohort-size 500] [--save-baseline]
+
+All database writes happen in one transaction that is rolled back at the end, and the
+synthetic zips and datasets live in a temporary directory.
+"""
+
+import json
+import math
+import tempfile
+import time
+from pathlib import Path
+
+import frappe
+
+from ff_assignment_portal import similarity
+from ff_assignment_portal.benchmarks import synthetic
+from ff_assignment_portal.ff_assignment_portal.doctype.ff_assignment_submission.ff_assignment_submission import (
+	FFAssignmentSubmission,
+)
+from ff_assignment_portal.ff_assignment_portal.report.ff_assignment_summary_by_student import (
+	ff_assignment_summary_by_student as summary_report,
+)
+from ff_assignment_portal.sql_portal.doctype.sql_problem_solution.sql_problem_solution import (
+	SQLProblemSolution,
+)
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+ASSIGNMENT_DOCTYPE_NAME = "FF Assignment Submission"
+
+
+class SyntheticSubmission(FFAssignmentSubmission):
+	"""Reads its archive from a local path instead of a `File` document."""
+
+	submission_path = None
+
+	def get_submission_path(self):
+		return self.submission_path
+
+	def get_submission_hash(self):
+		# always extract, the benchmark measures reading the archive itself
+		return None
+
+	def get_previous_check_results(self):
+		# run every rule, there is no previous attempt to reuse outcomes from
+		return {}
+
+
+class SyntheticSolution(SQLProblemSolution):
+	"""Grades against a local dataset instead of a `SQL Problem` and its problem set."""
+
+	synthetic_problem = None
+	data_set_path = None
+
+	def set_problem_data(self):
+		self.problem_data = self.synthetic_problem
+
+	def get_data_set_path(self):
+		return self.data_set_path
+
+	def get_engine(self):
+		return "SQLite"
+
+	def get_data_set_hash(self):
+		# never serve memoized verdicts, the benchmark measures grading itself
+		return None
+
+
+def run(
+	iterations: int = 50,
+	member_kb: int = 4,
+	dataset_rows: int = 10_000,
+	cohort_size: int = 200,
+	seed: int = 0,
+) -> dict:
+	results = {}
+
+	with tempfile.TemporaryDirectory(prefix="ff-benchmarks-") as tmp_dir:
+		tmp_dir = Path(tmp_dir)
+
+		for day in ("1", "2", "3"):
+			zip_path = synthetic.write_submission_zip(tmp_dir / f"day-{day}.zip", day, member_kb, seed)
+			results[f"check_pipeline_day_{day}"] = measure(
+				lambda: check_pipeline(day, zip_path), iterations
+			)
+
+		data_set_path = synthetic.write_sqlite_dataset(tmp_dir / "dataset.sqlite", dataset_rows, seed)
+		results["sql_grader"] = measure(lambda: grade_all(data_set_path), iterations)
+
+		try:
+			# the cohort's signatures go to a store of their own, not the site's
+			with similarity.use_store(str(tmp_dir / "similarity")):
+				insert_cohort(cohort_size, seed)
+				probe = new_synthetic_submission("1", synthetic.write_submission_zip(tmp_dir / "probe.zip", "1"))
+				probe.user = "bench-probe@example.com"
+				probe.set_file_hashes()
+				results["similarity_scorer"] = measure(probe.get_most_similar_submission, iterations)
+			results["summary_report"] = measure(summary_report.get_data, max(iterations // 10, 3))
+		finally:
+			frappe.db.rollback()
+
+	return results
+
+
+def check_pipeline(day, zip_path):
+	doc = new_synthetic_submission(day, zip_path)
+	doc.set_submission_summary()
+	doc.set_file_hashes()
+	doc.run_checks()
+
+
+def new_synthetic_submission(day, zip_path):
+	doc = SyntheticSubmission(
+		{
+			"doctype": ASSIGNMENT_DOCTYPE_NAME,
+			"user": "bench-student@example.com",
+			"day": day,
+			"submission": f"/private/files/{zip_path.name}",
+		}
+	)
+	doc.submission_path = str(zip_path)
+	return doc
+
+
+def grade_all(data_set_path):
+	for correct_query, student_query, consider_order in synthetic.SQL_PROBLEMS:
+		doc = SyntheticSolution(
+			{
+				"doctype": "SQL Problem Solution",
+				"student": "bench-student@example.com",
+				"last_submitted_query": student_query,
+			}
+		)
+		doc.synthetic_problem = frappe._dict(
+			correct_query=correct_query, consider_order=consider_order, problem_set=None
+		)
+		doc.data_set_path = str(data_set_path)
+		doc.run_check()
+
+
+def insert_cohort(size, seed):
+	now = frappe.utils.now()
+	rows = []
+	for i, (user, day, status, hashes) in enumerate(synthetic.cohort_rows(size, seed=seed)):
+		rows.append(
+			(
+				f"BENCH-{i:07}",
+				user,
+				day,
+				status,
+				f"/private/files/bench-{i}.zip",
+				hashes and frappe.as_json(hashes),
+				now,
+				now,
+				"Administrator",
+				"Administrator",
+			)
+		)
+
+	frappe.db.bulk_insert(
+		ASSIGNMENT_DOCTYPE_NAME,
+		("name", "user", "day", "status", "submission", "hashes", "creation", "modified", "owner", "modified_by"),
+		rows,
+	)
+
+	for name, user, day, status, _, hashes, *_ in rows:
+		if status == "Passed" and hashes:
+			similarity.add_submission(name, user, day, frappe.parse_json(hashes))
+	similarity.compact()
+
+
+def measure(fn, iterations: int) -> dict:
+	fn()  # warm up imports and caches, as a long-running worker would have
+
+	timings = []
+	started = time.perf_counter()
+	for _ in range(iterations):
+		start = time.perf_counter()
+		fn()
+		timings.append(time.perf_counter() - start)
+	total = time.perf_counter() - started
+
+	timings.sort()
+	return {
+		"iterations": iterations,
+		"p50_ms": percentile(timings, 50) * 1000,
+		"p99_ms": percentile(timings, 99) * 1000,
+		"throughput_per_sec": iterations / total if total else 0,
+	}
+
+
+def percentile(sorted_values, pct):
+	"""Nearest-rank percentile"""
+	if not sorted_values:
+		return 0
+	rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+	return sorted_values[rank - 1]
+
+
+def load_baseline() -> dict:
+	if not BASELINE_PATH.exists():
+		return {}
+	return json.loads(BASELINE_PATH.read_text())
+
+
+def save_baseline(results: dict):
+	BASELINE_PATH.write_text(json.dumps(results, indent=1, sort_keys=True) + "\n")
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.2) -> list[str]:
+	"""Returns a description of every latency that regressed by more than `tolerance`."""
+	regressions = []
+	for name, result in results.items():
+		if name not in baseline:
+			continue
+
+		for key in ("p50_ms", "p99_ms"):
+			previous = baseline[name].get(key)
+			if previous and result[key] > previous * (1 + tolerance):
+				regressions.append(f"{name} {key}: {previous:.2f} -> {result[key]:.2f}")
+
+	return regressions
@@ -0,0 +1,219 @@
+"""Generators for synthetic submissions, SQL datasets and cohorts used by the benchmarks.
+
+Everything is derived from a seeded `random.Random`, so two runs with the same arguments
+produce byte-identical inputs.
+"""
+
+import json
+import random
+import sqlite3
+import zipfile
+from hashlib import md5
+from pathlib import Path
+
+DAY_2_FILES = (
+	"airplane_flight.json",
+	"airplane_ticket.json",
+	"show-me.html",
+	"airplane_flight.html",
+	"airplane_flight_row.html",
+	"airplane_ticket.py",
+	"flight_passenger.py",
+	"airplane_flight.py",
+	"airplane_ticket_web_form.json",
+	"flight_reminder_notification.json",
+	"populate_seats.py",
+)
+DAY_3_FILES = (
+	"airline.js",
+	"airplane_ticket.js",
+	"airplane_ticket.py",
+	"airplane_ticket.json",
+	"airplane.json",
+	"airport.json",
+	"airplanes_by_airline.json",
+	"revenue_by_airline.py",
+	"add_on_popularity.json",
+)
+
+
+def doctype_json(name, fields, padding, **extra):
+	return {
+		"name": name,
+		"doctype": "DocType",
+		"fields": [{"fieldname": f"field_{i}", **field} for i, field in enumerate(fields)],
+		# not looked at by any check, only there to make the archive the requested size
+		"description": padding,
+		**extra,
+	}
+
+
+def day_1_members(padding):
+	return {
+		"airline.json": doctype_json(
+			"Airline",
+			[{"fieldtype": "Data", "reqd": 1}, {"fieldtype": "Data", "reqd": 1}, {"fieldtype": "Int"}],
+			padding,
+			links=[{"link_doctype": "Airplane", "link_fieldname": "airline"}],
+		),
+		"airplane.json": doctype_json(
+			"Airplane",
+			[
+				{"fieldtype": "Data", "reqd": 1},
+				{"fieldtype": "Int", "reqd": 1},
+				{"fieldtype": "Link", "reqd": 1},
+			],
+			padding,
+		),
+		"airplane_ticket.json": doctype_json(
+			"Airplane Ticket",
+			[{"fieldtype": "Date"}, {"fieldtype": "Time"}, {"fieldtype": "Duration"}]
+			+ [{"fieldtype": "Link"}] * 3
+			+ [{"fieldtype": "Link", "fetch_from": "flight.airplane"}] * 2,
+			padding,
+			is_submittable=1,
+			track_changes=1,
+			states=[{"title": "Booked"}, {"title": "Checked-In"}, {"title": "Boarded"}],
+		),
+		"flight_passenger.json": doctype_json(
+			"Flight Passenger",
+			[{"fieldtype": "Data"}, {"fieldtype": "Data"}, {"fieldtype": "Date"}],
+			padding,
+			naming_rule="Autoincrement",
+		),
+	}
+
+
+def day_2_members(padding):
+	members = {name: f"# {padding}\n" for name in DAY_2_FILES}
+	members.update(
+		{
+			"airplane_flight.json": doctype_json("Airplane Flight", [], padding, has_web_view=1),
+			"airplane_ticket.json": doctype_json("Airplane Ticket", [], padding),
+			"airplane_ticket_web_form.json": {"doc_type": "Airplane Ticket", "description": padding},
+			"flight_reminder_notification.json": {
+				"event": "Days Before",
+				"days_in_advance": 1,
+				"document_type": "Airplane Flight",
+				"condition": 'doc.status == "Scheduled"',
+				"message": padding,
+			},
+		}
+	)
+	return members
+
+
+def day_3_members(padding):
+	members = {name: f"// {padding}\n" for name in DAY_3_FILES}
+	members.update(
+		{
+			"airline.js": "frappe.ui.form.on('Airline', { refresh(frm) { frm.add_web_link('/'); } });\n"
+			+ f"// {padding}\n",
+			"airplane_ticket.js": "frm.add_custom_button('Assign Seat', () => {"
+			" new frappe.ui.Dialog({}); frm.set_value('seat', '1A'); });\n" + f"// {padding}\n",
+			"airplane_ticket.json": doctype_json(
+				"Airplane Ticket",
+				[],
+				padding,
+				permissions=[
+					{"role": "Flight Crew Member", "create": 1, "read": 1, "write": 1},
+					{"role": "Travel Agent", "create": 1, "read": 1, "write": 1, "delete": 1},
+					{
+						"role": "Airport Authority Personnel",
+						"create": 1,
+						"read": 1,
+						"write": 1,
+						"delete": 1,
+					},
+				],
+			),
+		}
+	)
+	for name in ("airplane.json", "airport.json", "airplanes_by_airline.json", "add_on_popularity.json"):
+		members[name] = doctype_json(name.removesuffix(".json").replace("_", " ").title(), [], padding)
+	return members
+
+
+MEMBER_BUILDERS = {"1": day_1_members, "2": day_2_members, "3": day_3_members}
+
+
+def write_submission_zip(path: Path, day: str, member_kb: int = 4, seed: int = 0) -> Path:
+	"""Write a zip that passes the schema checks for `day`, each member padded to ~`member_kb`."""
+	rng = random.Random(seed)
+	padding = "".join(rng.choices("abcdefghijklmnopqrstuvwxyz ", k=member_kb * 1024))
+
+	with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+		for name, content in MEMBER_BUILDERS[day](padding).items():
+			if not isinstance(content, str):
+				content = json.dumps(content, indent=1)
+			zip_file.writestr(f"submission/{name}", content)
+
+	return path
+
+
+def write_sqlite_dataset(path: Path, rows: int = 10_000, seed: int = 0) -> Path:
+	rng = random.Random(seed)
+	airlines = [f"Airline {i}" for i in range(20)]
+	airports = [f"AP{i:02}" for i in range(50)]
+
+	con = sqlite3.connect(path)
+	con.execute(
+		"CREATE TABLE flights (id INTEGER PRIMARY KEY, airline TEXT, origin TEXT, destination TEXT,"
+		" duration INTEGER, price REAL)"
+	)
+	con.executemany(
+		"INSERT INTO flights VALUES (?, ?, ?, ?, ?, ?)",
+		(
+			(
+				i,
+				rng.choice(airlines),
+				rng.choice(airports),
+				rng.choice(airports),
+				rng.randint(30, 900),
+				round(rng.uniform(50, 1500), 2),
+			)
+			for i in range(rows)
+		),
+	)
+	con.commit()
+	con.close()
+	return path
+
+
+# (correct query, student query, consider order)
+SQL_PROBLEMS = (
+	("SELECT id, price FROM flights WHERE price > 1000", "select id, price from flights where price > 1000", 0),
+	(
+		"SELECT airline, COUNT(*) FROM flights GROUP BY airline ORDER BY airline",
+		"SELECT airline, count(id) FROM flights GROUP BY 1 ORDER BY 1",
+		1,
+	),
+	(
+		"SELECT origin, AVG(duration) FROM flights GROUP BY origin",
+		"SELECT origin, AVG(duration) + 1 FROM flights GROUP BY origin",
+		0,
+	),
+	("SELECT * FROM flights ORDER BY price DESC LIMIT 100", "SELECT * FROM flights LIMIT 100", 1),
+)
+
+
+def cohort_rows(size: int, days=("1", "2", "3", "4"), copy_rate: float = 0.1, seed: int = 0):
+	"""Yield (user, day, status, hashes) for `size` students, some of whom copied each other."""
+	rng = random.Random(seed)
+	canonical = {
+		day: {name: md5(f"{day}:{name}".encode()).hexdigest() for name in builder("")}
+		for day, builder in MEMBER_BUILDERS.items()
+	}
+
+	for i in range(size):
+		user = f"bench-student-{i}@example.com"
+		for day in days:
+			# final projects are never hashed
+			hashes = None
+			if day in canonical:
+				hashes = {
+					name: digest if rng.random() < copy_rate else md5(f"{seed}:{i}:{name}".encode()).hexdigest()
+					for name, digest in canonical[day].items()
+				}
+			status = rng.choice(("Passed", "Passed", "Failed", "Check In Progress"))
+			yield user, day, status, hashes
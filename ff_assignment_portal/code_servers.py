@@ -0,0 +1,165 @@
+"""Placement of day 4 clones across the pool of code servers.
+
+Each enabled host in `Assignment Portal Settings` is scored by its free disk per active
+workspace, scaled by its weight, and clones go to the best scoring healthy host. Host load is
+probed over SSH at most once a minute (and by a scheduled health check), and placements
+made since the last probe are counted in Redis, so parallel clone jobs spread out instead of
+all landing on whichever host looked emptiest a minute ago. A host that cannot be reached is
+skipped for a few minutes and clones fail over to the next one.
+"""
+
+import paramiko
+
+import frappe
+
+from ff_assignment_portal.utils import get_ssh_client
+
+ASSIGNMENT_DOCTYPE_NAME = "FF Assignment Submission"
+BASE_DIR = "/home/school/ff-assignments"
+LOAD_TTL = 60  # seconds
+UNHEALTHY_TTL = 5 * 60  # seconds
+SSH_TIMEOUT = 10  # seconds
+PLACEMENTS_KEY = "ff_code_servers:placements"
+
+# connection refused, timeouts, dropped connections and authentication failures
+HOST_ERRORS = (paramiko.SSHException, OSError)
+
+
+def get_hosts() -> list[frappe._dict]:
+	settings = frappe.get_cached_doc("Assignment Portal Settings")
+	hosts = [
+		frappe._dict(host=row.host, weight=row.weight or 1)
+		for row in settings.code_server_hosts
+		if row.enabled
+	]
+
+	if not hosts and settings.code_server_host:
+		hosts = [frappe._dict(host=settings.code_server_host, weight=1)]
+
+	return hosts
+
+
+def get_candidate_hosts(sticky_host: str | None = None) -> list[str]:
+	"""Hosts to try, best first. `sticky_host` (where the submission was placed before) leads."""
+	hosts = get_hosts()
+	if not hosts:
+		frappe.throw("No code server configured in Assignment Portal Settings!")
+
+	healthy, unhealthy = [], []
+	for host in hosts:
+		(unhealthy if is_unhealthy(host.host) else healthy).append(host)
+
+	healthy.sort(key=lambda host: get_score(host), reverse=True)
+	# unreachable hosts are only retried once every healthy one has failed
+	candidates = [host.host for host in healthy + unhealthy]
+
+	if sticky_host in candidates:
+		candidates.remove(sticky_host)
+		candidates.insert(0, sticky_host)
+
+	return candidates
+
+
+def get_score(host: frappe._dict) -> float:
+	load = get_load(host.host)
+	if not load:
+		mark_unhealthy(host.host)
+		return float("-inf")
+
+	free_gb = load.free_kb / 1024 / 1024
+	return host.weight * free_gb / (1 + load.workspaces)
+
+
+def get_load(host: str) -> frappe._dict | None:
+	cache = frappe.cache()
+	load = cache.get_value(f"ff_code_servers:load:{host}")
+	if load is None:
+		load = probe(host)
+		if load is None:
+			return None
+
+	pipe = cache.pipeline()
+	pipe.hget(cache.make_key(PLACEMENTS_KEY), host)
+	(placed,) = pipe.execute()
+	return frappe._dict(free_kb=load["free_kb"], workspaces=load["workspaces"] + int(placed or 0))
+
+
+def probe(host: str) -> dict | None:
+	"""Measures free disk and workspace count on `host`, None if it is unreachable."""
+	try:
+		ssh = get_ssh_client(get_private_key(), host, timeout=SSH_TIMEOUT)
+		try:
+			_, stdout, _ = ssh.exec_command(
+				f"df -Pk {BASE_DIR} | tail -1 | awk '{{print $4}}' && ls -1 {BASE_DIR} | wc -l",
+				timeout=SSH_TIMEOUT,
+			)
+			free_kb, workspaces = stdout.read().decode().split()
+		finally:
+			ssh.close()
+	except (*HOST_ERRORS, ValueError):
+		return None
+
+	load = {"free_kb": int(free_kb), "workspaces": int(workspaces)}
+
+	cache = frappe.cache()
+	cache.set_value(f"ff_code_servers:load:{host}", load, expires_in_sec=LOAD_TTL)
+	# the fresh workspace count includes everything placed so far
+	pipe = cache.pipeline()
+	pipe.hdel(cache.make_key(PLACEMENTS_KEY), host)
+	pipe.execute()
+	cache.delete_value(f"ff_code_servers:unhealthy:{host}")
+	return load
+
+
+def record_placement(host: str):
+	cache = frappe.cache()
+	pipe = cache.pipeline()
+	pipe.hincrby(cache.make_key(PLACEMENTS_KEY), host, 1)
+	pipe.execute()
+
+
+def mark_unhealthy(host: str):
+	frappe.cache().set_value(f"ff_code_servers:unhealthy:{host}", 1, expires_in_sec=UNHEALTHY_TTL)
+
+
+def is_unhealthy(host: str) -> bool:
+	return bool(frappe.cache().get_value(f"ff_code_servers:unhealthy:{host}"))
+
+
+def use_delta_sync() -> bool:
+	settings = frappe.get_cached_doc("Assignment Portal Settings")
+	return (settings.code_server_sync_mode or "Delta") == "Delta"
+
+
+def get_private_key() -> str:
+	ssh_private_key = frappe.conf.ssh_private_key
+	if not ssh_private_key:
+		frappe.throw("SSH Private Key not set in site config!")
+
+	return ssh_private_key
+
+
+def check_hosts():
+	"""Runs every five minutes from the scheduler"""
+	for host in get_hosts():
+		if probe(host.host) is None:
+			mark_unhealthy(host.host)
+
+
+@frappe.whitelist()
+def clone_pending_submissions():
+	"""Queues a clone for every final submission that is not on a code server yet.
+
+	The jobs run in parallel on the workers and placement spreads them across the pool.
+	"""
+	frappe.only_for("System Manager")
+
+	pending = frappe.get_all(
+		ASSIGNMENT_DOCTYPE_NAME,
+		filters={"day": "4", "cloned_to_code_server": 0, "status": ("!=", "Stale")},
+		pluck="name",
+	)
+	for name in pending:
+		frappe.enqueue_doc(ASSIGNMENT_DOCTYPE_NAME, name, "_clone_to_code_server")
+
+	return len(pending)
@@ -0,0 +1,155 @@
+"""Delta sync of submission archives to a code server workspace.
+
+Every file of the archive is addressed by its SHA-256 digest. The code server keeps the
+contents it has already received in a shared object store next to the workspaces, so only
+files it has never seen travel over the wire, in a single gzipped tar. The workspace is then
+assembled on the server from the object store, and its manifest is stored alongside it, so
+syncing an unchanged submission again costs one round trip. Everything happens over the one
+SSH connection that is passed in.
+"""
+
+import hashlib
+import json
+import posixpath
+import shlex
+import tarfile
+import tempfile
+import zipfile
+
+import frappe
+
+from ff_assignment_portal import archive, metrics
+
+OBJECTS_DIR = ".objects"
+MANIFEST_FILENAME = ".ff-manifest"
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def sync_archive(ssh, archive_path: str, base_dir: str, workspace: str) -> bool:
+	"""Makes `base_dir/workspace` hold the files of the zip at `archive_path`.
+
+	Returns False if the workspace was already identical and nothing had to be done.
+	"""
+	with zipfile.ZipFile(archive_path) as zip_file:
+		members = get_workspace_members(zip_file)
+		# every member is decompressed below, so the same limits as for checking apply
+		archive.validate_limits(zip_file, list(members.values()))
+		manifest = {path: digest(zip_file, info) for path, info in members.items()}
+		manifest_json = json.dumps(manifest, sort_keys=True)
+
+		workspace_dir = posixpath.join(base_dir, workspace)
+		objects_dir = posixpath.join(base_dir, OBJECTS_DIR)
+		manifest_path = posixpath.join(workspace_dir, MANIFEST_FILENAME)
+
+		if run(ssh, f"cat {shlex.quote(manifest_path)} 2>/dev/null || true") == manifest_json:
+			return False
+
+		digests = sorted(set(manifest.values()))
+		missing = set(
+			run(
+				ssh,
+				f"mkdir -p {shlex.quote(objects_dir)} && cd {shlex.quote(objects_dir)} && "
+				'while read -r digest; do [ -e "$digest" ] || echo "$digest"; done',
+				stdin="".join(f"{digest}\n" for digest in digests),
+			).split()
+		)
+
+		metrics.inc("ff_clone_objects_total", len(missing), result="sent")
+		metrics.inc("ff_clone_objects_total", len(digests) - len(missing), result="reused")
+
+		sftp = ssh.open_sftp()
+		try:
+			if missing:
+				send_objects(ssh, sftp, zip_file, members, manifest, missing, objects_dir, workspace)
+
+			# rebuilt from scratch, so files removed from the archive do not linger
+			run(
+				ssh,
+				f"rm -rf {shlex.quote(workspace_dir)} && mkdir -p {shlex.quote(workspace_dir)} && "
+				f"cd {shlex.quote(workspace_dir)} && "
+				"while IFS=\"$(printf '\\t')\" read -r digest path; do "
+				f'mkdir -p -- "$(dirname -- "$path")" && cp -- {shlex.quote(objects_dir)}/"$digest" "$path"; done',
+				stdin="".join(f"{manifest[path]}\t{path}\n" for path in sorted(manifest)),
+			)
+
+			with sftp.open(manifest_path, "w") as f:
+				f.write(manifest_json)
+		finally:
+			sftp.close()
+
+	return True
+
+
+def get_workspace_members(zip_file: zipfile.ZipFile) -> dict[str, zipfile.ZipInfo]:
+	"""Members by their path inside the workspace, as `unzip -d` would lay them out"""
+	members = {}
+	for info in zip_file.infolist():
+		if not archive.is_relevant(info, None):
+			continue
+
+		path = posixpath.normpath(info.filename)
+		if (
+			path.startswith(("/", "../"))
+			or path == ".."
+			or any(c in path for c in "\t\n")
+			# would be read as an option by the commands that lay the workspace out
+			or any(part.startswith("-") for part in path.split("/"))
+		):
+			frappe.throw(f"Unsupported file name in the zip file: {frappe.bold(info.filename)}")
+
+		members[path] = info
+
+	return members
+
+
+def digest(zip_file: zipfile.ZipFile, info: zipfile.ZipInfo) -> str:
+	sha256 = hashlib.sha256()
+	size = 0
+	with zip_file.open(info) as member:
+		while chunk := member.read(READ_CHUNK_SIZE):
+			size += len(chunk)
+			# the declared size was checked already, but headers can lie about it
+			if size > info.file_size:
+				frappe.throw(f"{frappe.bold(info.filename)} is larger than the zip file claims.")
+			sha256.update(chunk)
+
+	return sha256.hexdigest()
+
+
+def send_objects(ssh, sftp, zip_file, members, manifest, missing, objects_dir, workspace):
+	remote_path = posixpath.join(objects_dir, f"incoming-{workspace}.tar.gz")
+
+	with tempfile.NamedTemporaryFile(suffix=".tar.gz") as f:
+		with tarfile.open(fileobj=f, mode="w:gz") as tar:
+			for path, info in members.items():
+				object_digest = manifest[path]
+				if object_digest not in missing:
+					continue
+
+				# several paths can share one object, send it once
+				missing = missing - {object_digest}
+				tar_info = tarfile.TarInfo(object_digest)
+				tar_info.size = info.file_size
+				with zip_file.open(info) as member:
+					tar.addfile(tar_info, member)
+
+		f.flush()
+		sftp.put(f.name, remote_path)
+
+	run(
+		ssh,
+		f"tar -xzf {shlex.quote(remote_path)} -C {shlex.quote(objects_dir)} && rm -f {shlex.quote(remote_path)}",
+	)
+
+
+def run(ssh, command: str, stdin: str | None = None) -> str:
+	channel_stdin, stdout, stderr = ssh.exec_command(command)
+	if stdin is not None:
+		channel_stdin.write(stdin)
+	channel_stdin.channel.shutdown_write()
+
+	output = stdout.read().decode()
+	if stdout.channel.recv_exit_status() != 0:
+		frappe.throw(f"stderr: {stderr.read().decode()}")
+
+	return output
@@ -0,0 +1,93 @@
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("run-portal-benchmarks")
+@click.option("--iterations", default=50, help="Timed runs per benchmark")
+@click.option("--member-kb", default=4, help="Approximate size of each member of the synthetic zips")
+@click.option("--dataset-rows", default=10_000, help="Rows in the synthetic SQLite dataset")
+@click.option("--cohort-size", default=200, help="Number of students in the synthetic cohort")
+@click.option("--seed", default=0)
+@click.option("--tolerance", default=0.2, help="Allowed slowdown against the baseline, 0.2 = 20%")
+@click.option("--save-baseline", is_flag=True, default=False, help="Store these results as the new baseline")
+@pass_context
+def run_portal_benchmarks(
+	context, iterations, member_kb, dataset_rows, cohort_size, seed, tolerance, save_baseline
+):
+	"Benchmark the assignment checker, similarity scorer, SQL grader and summary report"
+	from ff_assignment_portal import benchmarks
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+
+	try:
+		results = benchmarks.run(
+			iterations=iterations,
+			member_kb=member_kb,
+			dataset_rows=dataset_rows,
+			cohort_size=cohort_size,
+			seed=seed,
+		)
+	finally:
+		frappe.destroy()
+
+	baseline = benchmarks.load_baseline()
+	for name, result in results.items():
+		previous = baseline.get(name, {})
+		click.echo(
+			f"{name:<26} p50 {result['p50_ms']:9.2f} ms  p99 {result['p99_ms']:9.2f} ms  "
+			f"{result['throughput_per_sec']:9.1f}/s"
+			+ (f"  (baseline p50 {previous['p50_ms']:.2f} ms)" if previous else "")
+		)
+
+	if save_baseline:
+		benchmarks.save_baseline(results)
+		click.secho(f"Baseline saved to {benchmarks.BASELINE_PATH}", fg="green")
+		return
+
+	if not baseline:
+		click.secho("No baseline stored yet, run again with --save-baseline to create one.", fg="yellow")
+		return
+
+	regressions = benchmarks.compare(results, baseline, tolerance)
+	if regressions:
+		click.secho("Regressions against baseline:", fg="red")
+		for regression in regressions:
+			click.echo(f"  {regression}")
+		raise SystemExit(1)
+
+	click.secho("No regressions against baseline.", fg="green")
+
+
+@click.command("export-portal-data")
+@click.argument("data", type=click.Choice(["submissions", "sql-solutions"]))
+@click.option("--output", required=True, help="Path of the gzipped file to write")
+@click.option("--format", "export_format", type=click.Choice(["csv", "jsonl"]), default="csv")
+@click.option("--include-feedback", is_flag=True, default=False, help="Also export the feedback column")
+@click.option("--day", help="Only submissions for this day")
+@click.option("--problem", help="Only solutions to this SQL Problem")
+@click.option("--status")
+@pass_context
+def export_portal_data(context, data, output, export_format, include_feedback, day, problem, status):
+	"Export assignment submissions or SQL solutions as gzipped CSV or JSON Lines"
+	from ff_assignment_portal import exports
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	frappe.set_user("Administrator")
+
+	try:
+		if data == "submissions":
+			exports.write_submissions(export_format, include_feedback, day, status, path=output)
+		else:
+			exports.write_sql_solutions(export_format, include_feedback, problem, status, path=output)
+	finally:
+		frappe.destroy()
+
+	click.secho(f"Exported {data} to {output}", fg="green")
+
+
+commands = [run_portal_benchmarks, export_portal_data]
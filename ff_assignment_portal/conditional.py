@@ -0,0 +1,75 @@
+"""Conditional GET for the portal's read endpoints.
+
+Every cacheable resource has a version token in Redis, replaced whenever something the
+resource is built from changes (see `bump`). Endpoints send an ETag derived from the token.
+The browser keeps the response and revalidates it with `If-None-Match`, which is answered
+with an empty 304 after a single Redis read, before any database query runs. Idle tabs
+polling the portal cost next to nothing.
+
+Tokens are random rather than counters, so a token lost to a cache clear or eviction can
+never come back with a value a client still holds.
+"""
+
+import hashlib
+
+import frappe
+from werkzeug.wrappers import Response
+
+# part of every ETag, bump it when a payload's shape changes
+ETAG_SCHEMA = 1
+
+
+def conditional_response(resource: str, get_data):
+	"""Returns `get_data()` with an ETag for `resource`, or a 304 if the client's copy is current.
+
+	Only GET requests are conditional. Anything else gets `get_data()` as a plain return value.
+	"""
+	request = getattr(frappe.local, "request", None)
+	if not request or request.method != "GET":
+		return get_data()
+
+	# read before the data, so a change committed in between only costs a refetch
+	etag = get_etag(resource)
+	if request.if_none_match.contains(etag):
+		response = Response(status=304)
+	else:
+		response = Response(
+			frappe.as_json({"message": get_data()}, indent=None), mimetype="application/json"
+		)
+
+	response.set_etag(etag)
+	# always revalidate, and never keep it in a shared cache
+	response.headers["Cache-Control"] = "private, no-cache"
+	return response
+
+
+def get_etag(resource: str) -> str:
+	version = get_version(resource)
+	return hashlib.sha256(f"{ETAG_SCHEMA}\0{resource}\0{version}".encode()).hexdigest()[:32]
+
+
+def get_version(resource: str) -> str:
+	cache = frappe.cache()
+	version = cache.get_value(f"ff_version:{resource}")
+	if version is None:
+		version = frappe.generate_hash(length=16)
+		cache.set_value(f"ff_version:{resource}", version)
+
+	return version
+
+
+def bump(resource: str):
+	"""Invalidates the clients' copies of `resource` once the current transaction commits"""
+	frappe.db.after_commit.add(lambda: frappe.cache().delete_value(f"ff_version:{resource}"))
+
+
+def assignments_summary(user: str) -> str:
+	return f"assignments_summary:{user}"
+
+
+def solution_status(user: str, problem: str) -> str:
+	return f"solution_status:{user}:{problem}"
+
+
+def problem_set(name: str) -> str:
+	return f"problem_set:{name}"
@@ -0,0 +1,137 @@
+"""Streaming exports of submissions and SQL solutions for analytics.
+
+Rows are read in keyset-paginated chunks through an unbuffered (server-side) cursor and
+written one at a time to a gzipped CSV or JSON Lines file, so memory use stays flat however
+large the cohort is. The endpoints build the file first and then stream it to the client,
+because the database connection is gone by the time the response body is sent.
+"""
+
+import csv
+import gzip
+import json
+import os
+import tempfile
+
+import frappe
+from frappe.utils.response import json_handler
+from werkzeug.wrappers import Response
+
+CHUNK_SIZE = 2000
+STREAM_BLOCK_SIZE = 64 * 1024
+FORMATS = ("csv", "jsonl")
+
+SUBMISSION_FIELDS = [
+	"name",
+	"user",
+	"full_name",
+	"day",
+	"status",
+	"submission",
+	"demo_video",
+	"similarity_score",
+	"similar_assignment",
+	"cloned_to_code_server",
+	"creation",
+	"modified",
+]
+SOLUTION_FIELDS = ["name", "problem", "student", "status", "last_submitted_query", "creation", "modified"]
+
+
+@frappe.whitelist()
+def export_submissions(export_format="csv", include_feedback=0, day=None, status=None):
+	path = write_submissions(export_format, frappe.utils.cint(include_feedback), day, status)
+	return send_export(path, f"ff-assignment-submissions.{export_format}.gz")
+
+
+@frappe.whitelist()
+def export_sql_solutions(export_format="csv", include_feedback=0, problem=None, status=None):
+	path = write_sql_solutions(export_format, frappe.utils.cint(include_feedback), problem, status)
+	return send_export(path, f"sql-problem-solutions.{export_format}.gz")
+
+
+def write_submissions(export_format="csv", include_feedback=False, day=None, status=None, path=None) -> str:
+	filters = {}
+	if day:
+		filters["day"] = day
+	if status:
+		filters["status"] = status
+
+	fields = SUBMISSION_FIELDS + (["feedback"] if include_feedback else [])
+	return write_export("FF Assignment Submission", fields, filters, export_format, path)
+
+
+def write_sql_solutions(export_format="csv", include_feedback=False, problem=None, status=None, path=None) -> str:
+	filters = {}
+	if problem:
+		filters["problem"] = problem
+	if status:
+		filters["status"] = status
+
+	fields = SOLUTION_FIELDS + (["feedback"] if include_feedback else [])
+	return write_export("SQL Problem Solution", fields, filters, export_format, path)
+
+
+def write_export(
+	doctype: str, fields: list[str], filters: dict, export_format: str, path: str | None = None
+) -> str:
+	"""Writes the matching rows to a gzipped file at `path` (a temporary file by default)."""
+	frappe.has_permission(doctype, "export", throw=True)
+	if export_format not in FORMATS:
+		frappe.throw(f"Unsupported export format {frappe.bold(export_format)}, use one of {', '.join(FORMATS)}.")
+
+	if not path:
+		fd, path = tempfile.mkstemp(prefix="ff-export-", suffix=f".{export_format}.gz")
+		os.close(fd)
+
+	with gzip.open(path, "wt", newline="", encoding="utf-8") as f:
+		if export_format == "csv":
+			writer = csv.writer(f)
+			writer.writerow(fields)
+			for row in iter_rows(doctype, fields, filters):
+				writer.writerow([row[field] for field in fields])
+		else:
+			for row in iter_rows(doctype, fields, filters):
+				f.write(json.dumps(row, default=json_handler, ensure_ascii=False))
+				f.write("\n")
+
+	return path
+
+
+def iter_rows(doctype: str, fields: list[str], filters: dict):
+	"""Yields rows ordered by name, `CHUNK_SIZE` at a time, without buffering a chunk in memory"""
+	last_name = ""
+	while True:
+		query = frappe.qb.get_query(
+			doctype,
+			fields=fields,
+			filters={**filters, "name": (">", last_name)},
+			order_by="name asc",
+			limit=CHUNK_SIZE,
+		)
+
+		num_rows = 0
+		with frappe.db.unbuffered_cursor():
+			for row in query.run(as_dict=True, as_iterator=True):
+				num_rows += 1
+				last_name = row["name"]
+				yield row
+
+		if num_rows < CHUNK_SIZE:
+			return
+
+
+def send_export(path: str, filename: str) -> Response:
+	def stream():
+		try:
+			with open(path, "rb") as f:
+				while block := f.read(STREAM_BLOCK_SIZE):
+					yield block
+		finally:
+			os.unlink(path)
+
+	return Response(
+		stream(),
+		mimetype="application/gzip",
+		headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+		direct_passthrough=True,
+	)
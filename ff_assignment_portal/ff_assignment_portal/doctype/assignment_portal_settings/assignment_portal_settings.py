@@ -12,11 +12,19 @@ class AssignmentPortalSettings(Document):
 	from typing import TYPE_CHECKING
 
 	if TYPE_CHECKING:
+		from ff_assignment_portal.ff_assignment_portal.doctype.code_server_host.code_server_host import (
+			CodeServerHost,
+		)
 		from frappe.types import DF
 
 		code_server_host: DF.Data | None
+		code_server_hosts: DF.Table[CodeServerHost]
 		code_server_password: DF.Password | None
+		code_server_sync_mode: DF.Literal["Delta", "Full Archive"]
+		enable_profiling: DF.Check
 		private_key_type: DF.Literal["ed25519", "rsa"]
+		profiled_users: DF.SmallText | None
+		profiling_sample_rate: DF.Percent
 	# end: auto-generated types
 
 	pass
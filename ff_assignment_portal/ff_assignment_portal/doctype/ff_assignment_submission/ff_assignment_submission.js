@@ -20,7 +20,8 @@ frappe.ui.form.on("FF Assignment Submission", {
         }
 
         if (frm.doc.cloned_to_code_server) {
-            frm.add_web_link(`https://code.frappe.school/?folder=/home/school/ff-assignments/${frm.doc.name}`, "View in Code Server")
+            const host = frm.doc.code_server_host || "code.frappe.school"
+            frm.add_web_link(`https://${host}/?folder=/home/school/ff-assignments/${frm.doc.name}`, "View in Code Server")
         }
 	},
 });
@@ -3,11 +3,29 @@
 
 import json
 import frappe
-import zipfile
+
+from hashlib import md5
 
 from frappe.model.document import Document
 
+from ff_assignment_portal import (
+    archive,
+    archive_cache,
+    conditional,
+    metrics,
+    notifications,
+    realtime,
+    similarity,
+    tiering,
+)
+from ff_assignment_portal.ff_assignment_portal.report.ff_assignment_summary_by_student import (
+    ff_assignment_summary_by_student as summary_report,
+)
+from ff_assignment_portal.rate_limit import rate_limit
+
 ASSIGNMENT_DOCTYPE_NAME = "FF Assignment Submission"
+# bump whenever a check rule changes, so outcomes of older attempts are not reused
+CHECK_RULES_VERSION = 1
 
 doctype_check_parameters_map = {
     "Flight Passenger": {
@@ -48,12 +66,15 @@ class FFAssignmentSubmission(Document):
     if TYPE_CHECKING:
         from frappe.types import DF
 
+        check_results: DF.Code | None
         cloned_to_code_server: DF.Check
+        code_server_host: DF.Data | None
         day: DF.Literal["1", "2", "3", "4"]
         demo_video: DF.Attach | None
         feedback: DF.HTMLEditor | None
         full_name: DF.Data | None
         hashes: DF.Code | None
+        similar_archived_submission: DF.Data | None
         similar_assignment: DF.Link | None
         similarity_score: DF.Percent
         status: DF.Literal[
@@ -72,11 +93,28 @@ class FFAssignmentSubmission(Document):
         if not self.is_new() and self.has_value_changed("status"):
             self.notify_student()
 
+        if self.has_value_changed("status"):
+            conditional.bump(conditional.assignments_summary(self.user))
+            summary_report.mark_dirty(self.user)
+
+        if self.has_value_changed("status") or self.has_value_changed("feedback"):
+            realtime.publish_submission_update(
+                self.user, {field: self.get(field) for field in realtime.FIELDS}
+            )
+
+        if self.day != "4" and self.status == "Passed" and self.has_value_changed("status"):
+            similarity.add_after_commit(self.name, self.user, self.day, self.hashes)
+
+    def on_trash(self):
+        conditional.bump(conditional.assignments_summary(self.user))
+        summary_report.mark_dirty(self.user)
+
     def before_insert(self):
         self.validate_previous_in_progress()
         self.set_submission_summary()
-        self.run_checks()
+        # the hashes tell which check rules can reuse the previous attempt's outcome
         self.set_file_hashes()
+        self.run_checks()
 
     def after_insert(self):
         self.enqueue_generate_similarity_score()
@@ -89,37 +127,48 @@ class FFAssignmentSubmission(Document):
         frappe.enqueue_doc(
             ASSIGNMENT_DOCTYPE_NAME,
             self.name,
-            "_generate_similarity_score",
+            "generate_similarity_score_if_latest",
             queue="long",
+            enqueue_after_commit=True,
         )
 
-    @frappe.whitelist()
-    def _generate_similarity_score(self):
-        submissions = frappe.db.get_all(
-            self.doctype,
-            fields=["name", "hashes"],
-            filters={"day": self.day, "status": "Passed", "user": ("!=", self.user)},
+    def generate_similarity_score_if_latest(self):
+        # a student re-submitting in a loop queues one job per attempt, only the
+        # latest attempt is worth scoring so the others get out of the way quickly
+        newer_submission_exists = frappe.db.exists(
+            ASSIGNMENT_DOCTYPE_NAME,
+            {"user": self.user, "day": self.day, "creation": (">", self.creation)},
         )
+        if newer_submission_exists:
+            return
 
-        max_similarity_score = 0
-        similar_assignment = None
-
-        for submission in submissions:
-            if not submission.hashes:
-                continue
-            file_hashes = frappe.parse_json(submission.hashes)
-            current_submission_hashes = frappe.parse_json(self.hashes)
+        self._generate_similarity_score()
 
-            similarity_score = compare_hashes(file_hashes, current_submission_hashes)
+    @frappe.whitelist()
+    def _generate_similarity_score(self):
+        with metrics.timer("ff_similarity_duration_seconds", day=self.day):
+            self.similarity_score, similar_submission = self.get_most_similar_submission()
 
-            if similarity_score > max_similarity_score:
-                max_similarity_score = similarity_score
-                similar_assignment = submission.name
+        # submissions of earlier cohorts may no longer exist on this site
+        if similar_submission and not frappe.db.exists(self.doctype, similar_submission):
+            self.similar_assignment = None
+            self.similar_archived_submission = similar_submission
+        else:
+            self.similar_assignment = similar_submission
+            self.similar_archived_submission = None
 
-        self.similarity_score = max_similarity_score
-        self.similar_assignment = similar_assignment
         self.save()
 
+    def get_most_similar_submission(self):
+        # scored against the signature store, which holds every passed submission of
+        # this and earlier cohorts, with the same semantics as `compare_hashes`
+        similarity_score, similar_submission, num_records = similarity.find_most_similar(
+            self.day, frappe.parse_json(self.hashes or "{}"), self.user
+        )
+
+        metrics.inc("ff_similarity_comparisons_total", num_records, day=self.day)
+        return similarity_score, similar_submission
+
     def validate_previous_in_progress(self):
         previous_in_progress = frappe.db.get_all(
             ASSIGNMENT_DOCTYPE_NAME,
@@ -128,8 +177,13 @@ class FFAssignmentSubmission(Document):
         )
 
         if previous_in_progress:
+            conditional.bump(conditional.assignments_summary(self.user))
+            summary_report.mark_dirty(self.user)
             for name in previous_in_progress:
                 frappe.db.set_value(ASSIGNMENT_DOCTYPE_NAME, name, "status", "Stale")
+                realtime.publish_submission_update(
+                    self.user, {"name": name, "day": self.day, "status": "Stale"}
+                )
 
     def set_submission_summary(self):
         summary = ""
@@ -145,20 +199,23 @@ class FFAssignmentSubmission(Document):
         self.submission_summary = summary
 
     def notify_student(self):
-        if frappe.conf.developer_mode or self.day == "4":
+        if not notifications.should_notify(self.day):
             return
-        
 
-        try:
-            frappe.sendmail(
-                recipients=self.user,
-                subject=f"[Frappe School] There is an update on your submission for Day {self.day}",
-                message=self.feedback,
-            )
-        except Exception:
-            frappe.log_error("Error sending notification to student", "Email sending failed", self.doctype, self.name)
+        # sent from a scheduled job, together with any other updates for this student
+        notifications.queue_after_commit(self.user, self.name)
 
     def run_checks(self):
+        self._check_results = {}
+        with metrics.timer("ff_check_duration_seconds", day=self.day):
+            self.run_checks_for_day()
+
+        if self._check_results:
+            self.check_results = frappe.as_json(self._check_results, indent=2)
+
+        metrics.inc("ff_checks_total", day=self.day, status=self.status)
+
+    def run_checks_for_day(self):
         if self.day == "1":
             self.run_checks_for_day_1()
         elif self.day == "2":
@@ -188,22 +245,33 @@ class FFAssignmentSubmission(Document):
             "airplane_ticket.json",
             "flight_passenger.json",
         ]
-        for filename, _ in filename_with_contents:
-            if filename not in expected_filenames:
-                all_problems.append(
-                    f"Expected file name to be one of {expected_filenames}, but found {filename}."
-                )
+        filenames = [filename for filename, _ in filename_with_contents]
+
+        def check_file_names(problems):
+            for filename in filenames:
+                if filename not in expected_filenames:
+                    problems.append(
+                        f"Expected file name to be one of {expected_filenames}, but found {filename}."
+                    )
+
+        all_problems.extend(
+            self.run_rule("file_names", filenames, check_file_names, compare_contents=False)
+        )
 
         for filename, file_json in filename_with_contents:
             doctype_name = guess_doctype_from_filename(filename)
-            submission_doctype_json = SubmissionDocTypeJSON(
-                filename,
-                file_json,
-                **doctype_check_parameters_map.get(doctype_name, {}),
+
+            def check_doctype(problems):
+                submission_doctype_json = SubmissionDocTypeJSON(
+                    filename,
+                    file_json,
+                    **doctype_check_parameters_map.get(doctype_name, {}),
+                )
+                problems.extend(submission_doctype_json.run_checks() or [])
+
+            all_problems.extend(
+                self.run_rule(doctype_name or filename, [filename], check_doctype)
             )
-            problems = submission_doctype_json.run_checks()
-            if problems:
-                all_problems.extend(problems)
 
         if all_problems:
             self.status = "Failed"
@@ -243,8 +311,44 @@ class FFAssignmentSubmission(Document):
             "populate_seats.py",
         ]
 
-        self.check_required_files(required_files_in_zip, problems)
+        filenames = [filename for filename, _ in self.get_filename_with_contents()]
+
+        problems.extend(
+            self.run_rule(
+                "required_files",
+                filenames,
+                lambda problems: self.check_required_files(required_files_in_zip, problems),
+                compare_contents=False,
+            )
+        )
+
+        problems.extend(
+            self.run_rule(
+                "web_form",
+                [f for f in filenames if f.endswith("web_form.json")],
+                self.check_web_form_for_day_2,
+            )
+        )
+
+        problems.extend(
+            self.run_rule(
+                "notification",
+                [f for f in filenames if f.endswith("notification.json")],
+                self.check_notification_for_day_2,
+            )
+        )
+
+        problems.extend(
+            self.run_rule(
+                "web_view",
+                [f for f in filenames if f.endswith("airplane_flight.json")],
+                self.check_web_view_for_day_2,
+            )
+        )
+
+        return problems
 
+    def check_web_form_for_day_2(self, problems):
         # check the web form json
         web_form_json = None
         for filename, file_json in self.get_filename_with_contents():
@@ -257,6 +361,7 @@ class FFAssignmentSubmission(Document):
             if web_form_json.get("doc_type") != "Airplane Ticket":
                 problems.append("Web Form must be for Airplane Ticket DocType.")
 
+    def check_notification_for_day_2(self, problems):
         # Check the notification json
         notification_json = None
         for filename, file_json in self.get_filename_with_contents():
@@ -288,6 +393,7 @@ class FFAssignmentSubmission(Document):
                     f"Notification must be for {frappe.bold('Scheduled')} Airplane Flights only."
                 )
 
+    def check_web_view_for_day_2(self, problems):
         # Web View must be enabled for Airplane Flight DocType (i.e. has_web_view must be 1)
         airplane_flight_doctype = None
         for filename, file_json in self.get_filename_with_contents():
@@ -301,8 +407,6 @@ class FFAssignmentSubmission(Document):
                     f"Web View must be enabled for {frappe.bold('Airplane Flight')} DocType."
                 )
 
-        return problems
-
     def check_required_files(self, required_files_in_zip, problems):
         filename_with_contents = list(self.get_filename_with_contents())
 
@@ -348,7 +452,16 @@ class FFAssignmentSubmission(Document):
             "add_on_popularity.json",
         ]
 
-        self.check_required_files(required_files_in_zip, problems)
+        filenames = [filename for filename, _ in self.get_filename_with_contents()]
+
+        problems.extend(
+            self.run_rule(
+                "required_files",
+                filenames,
+                lambda problems: self.check_required_files(required_files_in_zip, problems),
+                compare_contents=False,
+            )
+        )
 
         if problems:
             return problems
@@ -366,50 +479,123 @@ class FFAssignmentSubmission(Document):
             if file_name.endswith(".json")
         }
 
-        check_client_scripts(js_files, problems)
+        problems.extend(
+            self.run_rule(
+                "client_scripts",
+                list(js_files),
+                lambda problems: check_client_scripts(js_files, problems),
+            )
+        )
 
         # check if proper permissions are applied
-        check_permissions_for_day_3(json_files, problems)
+        problems.extend(
+            self.run_rule(
+                "permissions",
+                list(json_files),
+                lambda problems: check_permissions_for_day_3(json_files, problems),
+            )
+        )
+
+        return problems
 
+    def run_rule(self, rule, filenames, check, compare_contents=True):
+        """Returns the problems `check` finds, reusing the outcome of the student's previous
+        attempt for this day when the files the rule reads are unchanged.
+
+        `check` appends problems to the list it is passed. Rules that only look at which
+        files are present pass `compare_contents=False`.
+        """
+        digest = self.get_rule_digest(filenames, compare_contents)
+        previous = self.get_previous_check_results().get(rule)
+
+        if previous and previous["digest"] == digest:
+            problems = previous["problems"]
+            metrics.inc("ff_check_rules_total", day=self.day, result="reused")
+        else:
+            problems = []
+            with self.rule_timer(rule):
+                check(problems)
+            metrics.inc("ff_check_rules_total", day=self.day, result="run")
+
+        self._check_results[rule] = {"digest": digest, "problems": problems}
         return problems
 
+    def get_rule_digest(self, filenames, compare_contents=True):
+        hashes = json.loads(self.hashes or "{}")
+        rule_input = [
+            (filename, hashes.get(filename) if compare_contents else None)
+            for filename in filenames
+        ]
+        return md5(frappe.as_json([CHECK_RULES_VERSION, rule_input]).encode()).hexdigest()
+
+    def get_previous_check_results(self):
+        if hasattr(self, "_previous_check_results"):
+            return self._previous_check_results
+
+        filters = {"user": self.user, "day": self.day, "check_results": ("is", "set")}
+        if not self.is_new():
+            filters["creation"] = ("<", self.creation)
+
+        previous = frappe.db.get_value(
+            ASSIGNMENT_DOCTYPE_NAME,
+            filters,
+            "check_results",
+            order_by="creation desc",
+        )
+        self._previous_check_results = json.loads(previous) if previous else {}
+        return self._previous_check_results
+
+    def rule_timer(self, rule):
+        return metrics.timer("ff_check_rule_duration_seconds", day=self.day, rule=rule)
+
     def mark_as_check_in_progress(self):
         self.status = "Check In Progress"
 
     def get_filename_with_contents(self):
-        file_doc = frappe.get_doc("File", {"file_url": self.submission})
-
-        with zipfile.ZipFile(file_doc.get_full_path()) as zip_file:
-            for file_name in zip_file.namelist():
-                # ignore files that contain __MACOSX and .DS_Store
-                if "__MACOSX" in file_name or ".DS_Store" in file_name:
-                    continue
-
-                if file_name.endswith((".json", ".py", ".html", ".js")):
-                    file_json = zip_file.read(file_name).decode("utf-8")
-                    if file_name.endswith(".json"):
-                        try:
-                            file_json = json.loads(file_json)
-                        except json.decoder.JSONDecodeError:
-                            frappe.throw(
-                                f"Unable to parse JSON file. There is a problem with your JSON file: {frappe.bold(file_name)}."
-                            )
-                    parts = file_name.split("/")
-                    file_name = parts[-1]
-
-                    if len(parts) > 2:
-                        frappe.throw(
-                            f"You have files inside a sub-directory ({parts[0]}/{parts[1]}), please place all the required files directly inside the zipped folder."
-                        )
-
-                    yield file_name, file_json
+        with metrics.timer("ff_zip_read_duration_seconds"):
+            return archive_cache.get_members(
+                self.get_submission_hash(),
+                lambda: list(self.iter_filename_with_contents()),
+            )
+
+    def get_submission_path(self):
+        tiering.ensure_on_disk(self.submission)
+        return frappe.get_doc("File", {"file_url": self.submission}).get_full_path()
+
+    def get_submission_hash(self):
+        return frappe.db.get_value("File", {"file_url": self.submission}, "content_hash")
+
+    def iter_filename_with_contents(self):
+        for file_name, content in archive.iter_members(self.get_submission_path()):
+            metrics.inc("ff_zip_members_read_total")
+            try:
+                file_json = content.decode("utf-8")
+            except UnicodeDecodeError:
+                frappe.throw(
+                    f"Unable to read {frappe.bold(file_name)}, please make sure it is saved as UTF-8 text."
+                )
+
+            if file_name.endswith(".json"):
+                try:
+                    file_json = json.loads(file_json)
+                except json.decoder.JSONDecodeError:
+                    frappe.throw(
+                        f"Unable to parse JSON file. There is a problem with your JSON file: {frappe.bold(file_name)}."
+                    )
+            parts = file_name.split("/")
+            file_name = parts[-1]
+
+            if len(parts) > 2:
+                frappe.throw(
+                    f"You have files inside a sub-directory ({parts[0]}/{parts[1]}), please place all the required files directly inside the zipped folder."
+                )
+
+            yield file_name, file_json
 
     def set_file_hashes(self):
         if self.day == "4":
             return
 
-        from hashlib import md5
-
         files_with_content = self.get_filename_with_contents()
         hashes = {}
 
@@ -440,22 +626,56 @@ class FFAssignmentSubmission(Document):
             )
 
     def _clone_to_code_server(self):
-        ssh_private_key = frappe.conf.ssh_private_key
+        try:
+            with metrics.timer("ff_clone_duration_seconds"):
+                self.copy_submission_to_code_server()
+        except Exception:
+            metrics.inc("ff_clones_total", result="failure")
+            raise
 
-        if not ssh_private_key:
-            frappe.throw("SSH Private Key not set in site config!")
+        metrics.inc("ff_clones_total", result="success")
 
+    def copy_submission_to_code_server(self):
+        from ff_assignment_portal import code_servers
         from ff_assignment_portal.utils import get_ssh_client
 
-        ssh = get_ssh_client(ssh_private_key)
+        ssh_private_key = code_servers.get_private_key()
 
-        # scp the zip file to code server
-        assignment_file = self.submission
-        assignment_file_doc = frappe.get_doc("File", {"file_url": assignment_file})
-        assignment_file_path = assignment_file_doc.get_full_path()
+        # stick to the host this submission was placed on, fail over to the next best one
+        last_error = None
+        for host in code_servers.get_candidate_hosts(self.code_server_host):
+            code_servers.record_placement(host)
+            try:
+                ssh = get_ssh_client(
+                    ssh_private_key, host, timeout=code_servers.SSH_TIMEOUT
+                )
+                try:
+                    self.copy_submission_to_host(ssh)
+                finally:
+                    ssh.close()
+            except code_servers.HOST_ERRORS as e:
+                code_servers.mark_unhealthy(host)
+                last_error = e
+                continue
+
+            self.code_server_host = host
+            self.cloned_to_code_server = 1
+            self.save()
+            return
+
+        frappe.throw(f"Unable to reach any code server: {last_error}")
+
+    def copy_submission_to_host(self, ssh):
+        from ff_assignment_portal import code_servers, code_sync
+
+        assignment_file_path = self.get_submission_path()
+        base_dir = code_servers.BASE_DIR
 
-        base_dir = "/home/school/ff-assignments"
+        if code_servers.use_delta_sync():
+            code_sync.sync_archive(ssh, assignment_file_path, base_dir, self.name)
+            return
 
+        # scp the zip file to code server
         sftp = ssh.open_sftp()
         sftp.put(assignment_file_path, f"{base_dir}/{self.name}.zip")
 
@@ -472,10 +692,6 @@ class FFAssignmentSubmission(Document):
         # delete the zip file
         sftp.remove(f"{base_dir}/{self.name}.zip")
 
-        self.cloned_to_code_server = 1
-        self.save()
-        ssh.close()
-
 
 class SubmissionDocTypeJSON:
     def __init__(
@@ -662,17 +878,46 @@ class SubmissionDocTypeJSON:
 
 
 @frappe.whitelist()
-def submit_assignment(day, file, demo_video=None):
+@rate_limit(rate=0.1, burst=3)
+def submit_assignment(day, file, demo_video=None, idempotency_key=None):
     if day == "4" and not demo_video:
         frappe.throw("Demo video is required to be submitted with final assignment!")
 
+    user = frappe.session.user
+    # a retried submit, after a double click or a lost response, is the same submission
+    if idempotency_key and frappe.db.exists(
+        ASSIGNMENT_DOCTYPE_NAME, {"user": user, "idempotency_key": idempotency_key}
+    ):
+        return
+
     submission_doc: FFAssignmentSubmission = frappe.new_doc("FF Assignment Submission")
-    submission_doc.user = frappe.session.user
+    submission_doc.user = user
     submission_doc.submission = file.get("file_url")
     submission_doc.day = day
     if demo_video:
         submission_doc.demo_video = demo_video.get("file_url")
-    submission_doc.insert()
+    submission_doc.idempotency_key = idempotency_key or None
+
+    frappe.db.savepoint("submit_assignment")
+    try:
+        submission_doc.insert()
+    except frappe.UniqueValidationError:
+        if not idempotency_key:
+            raise
+
+        # a concurrent retry inserted it first, see `on_doctype_update`
+        frappe.db.rollback(save_point="submit_assignment")
+
+
+def on_doctype_update():
+    frappe.db.add_unique(
+        ASSIGNMENT_DOCTYPE_NAME, ["user", "idempotency_key"], "user_idempotency_key"
+    )
+    # latest attempt of a student for a day, and "has this student passed this day"
+    frappe.db.add_index(ASSIGNMENT_DOCTYPE_NAME, ["user", "day", "status"], "user_day_status_index")
+    frappe.db.add_index(ASSIGNMENT_DOCTYPE_NAME, ["user", "day", "creation"], "user_day_creation_index")
+    # passed submissions of a day, for similarity scoring
+    frappe.db.add_index(ASSIGNMENT_DOCTYPE_NAME, ["day", "status"], "day_status_index")
 
 
 def guess_doctype_from_filename(filename):
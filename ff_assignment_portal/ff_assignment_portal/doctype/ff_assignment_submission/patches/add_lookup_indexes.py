@@ -0,0 +1,7 @@
+from ff_assignment_portal.ff_assignment_portal.doctype.ff_assignment_submission.ff_assignment_submission import (
+    on_doctype_update,
+)
+
+
+def execute():
+    on_doctype_update()
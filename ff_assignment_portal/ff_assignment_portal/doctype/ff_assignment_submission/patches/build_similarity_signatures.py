@@ -0,0 +1,18 @@
+import frappe
+
+from ff_assignment_portal import similarity
+
+
+def execute():
+    submissions = frappe.db.get_all(
+        "FF Assignment Submission",
+        filters={"status": "Passed", "day": ("!=", "4"), "hashes": ("is", "set")},
+        fields=["name", "user", "day", "hashes"],
+    )
+
+    for submission in submissions:
+        similarity.add_submission(
+            submission.name, submission.user, submission.day, frappe.parse_json(submission.hashes)
+        )
+
+    similarity.compact()
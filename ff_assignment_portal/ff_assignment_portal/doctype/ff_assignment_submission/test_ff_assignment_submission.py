@@ -1,9 +1,18 @@
 # Copyright (c) 2023, Hussain Nagaria and Contributors
 # See license.txt
 
-# import frappe
+import io
+import json
+import zipfile
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from ff_assignment_portal.ff_assignment_portal.doctype.ff_assignment_submission.ff_assignment_submission import (
+	SubmissionDocTypeJSON,
+)
+
 
 class TestFFAssignmentSubmission(FrappeTestCase):
 	def test_similarity_score_generation(self):
@@ -12,3 +21,51 @@ class TestFFAssignmentSubmission(FrappeTestCase):
 		# call generate method
 		# check the score
 		pass
+
+	def test_reuses_rule_outcome_for_unchanged_files(self):
+		files = {
+			"airline.json": {"name": "Airline", "fields": []},
+			"airplane.json": {"name": "Airplane", "fields": []},
+			"airplane_ticket.json": {"name": "Airplane Ticket", "fields": []},
+			"flight_passenger.json": {"name": "Flight Passenger", "fields": []},
+		}
+		previous = self.insert_submission(files)
+
+		files["airplane.json"] = {"name": "Airplane", "fields": [{"fieldname": "model", "fieldtype": "Data"}]}
+		with patch.object(
+			SubmissionDocTypeJSON, "run_checks", autospec=True, side_effect=SubmissionDocTypeJSON.run_checks
+		) as run_checks:
+			resubmission = self.insert_submission(files)
+
+		# only the rule reading the changed file ran again
+		self.assertEqual([call.args[0].filename for call in run_checks.call_args_list], ["airplane.json"])
+
+		previous_results = json.loads(previous.check_results)
+		check_results = json.loads(resubmission.check_results)
+		for rule in ("file_names", "Airline", "Airplane Ticket", "Flight Passenger"):
+			self.assertEqual(check_results[rule], previous_results[rule])
+		self.assertNotEqual(check_results["Airplane"]["digest"], previous_results["Airplane"]["digest"])
+
+	def insert_submission(self, files: dict):
+		content = io.BytesIO()
+		with zipfile.ZipFile(content, "w") as zip_file:
+			for file_name, doctype_json in files.items():
+				zip_file.writestr(f"submission/{file_name}", frappe.as_json(doctype_json))
+
+		file_doc = frappe.get_doc(
+			{
+				"doctype": "File",
+				"file_name": "submission.zip",
+				"is_private": 1,
+				"content": content.getvalue(),
+			}
+		).insert()
+
+		return frappe.get_doc(
+			{
+				"doctype": "FF Assignment Submission",
+				"user": "Administrator",
+				"day": "1",
+				"submission": file_doc.file_url,
+			}
+		).insert()
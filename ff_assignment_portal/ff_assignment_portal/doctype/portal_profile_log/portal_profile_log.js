@@ -0,0 +1,14 @@
+// Copyright (c) 2026, Hussain Nagaria and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("Portal Profile Log", {
+	refresh(frm) {
+		if (frm.doc.folded_stacks) {
+			frm.add_custom_button("Download Folded Stacks", () => {
+				window.open(
+					`/api/method/ff_assignment_portal.ff_assignment_portal.doctype.portal_profile_log.portal_profile_log.download_folded_stacks?name=${encodeURIComponent(frm.doc.name)}`
+				);
+			});
+		}
+	},
+});
@@ -0,0 +1,39 @@
+# Copyright (c) 2026, Hussain Nagaria and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class PortalProfileLog(Document):
+	# begin: auto-generated types
+	# This code is auto-generated. Do not modify anything in this block.
+
+	from typing import TYPE_CHECKING
+
+	if TYPE_CHECKING:
+		from frappe.types import DF
+
+		duration: DF.Float
+		endpoint: DF.Data | None
+		folded_stacks: DF.Code | None
+		sections: DF.Code | None
+		sql_duration: DF.Float
+		sql_query_count: DF.Int
+		sqlite_io_duration: DF.Float
+		stats: DF.Code | None
+		user: DF.Link | None
+		zip_io_duration: DF.Float
+	# end: auto-generated types
+
+	pass
+
+
+@frappe.whitelist()
+def download_folded_stacks(name):
+	frappe.only_for("System Manager")
+	log = frappe.get_doc("Portal Profile Log", name)
+
+	frappe.response.filename = f"{log.endpoint.rsplit('.', 1)[-1]}-{log.name}.folded"
+	frappe.response.filecontent = log.folded_stacks or ""
+	frappe.response.type = "download"
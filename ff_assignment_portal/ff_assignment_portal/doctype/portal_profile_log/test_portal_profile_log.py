@@ -0,0 +1,34 @@
+# Copyright (c) 2026, Hussain Nagaria and Contributors
+# See license.txt
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ff_assignment_portal import api, profiler
+
+ENDPOINT = "ff_assignment_portal.api.get_assignments_summary"
+
+
+class TestPortalProfileLog(FrappeTestCase):
+	def test_profiles_listed_users(self):
+		frappe.db.set_single_value(
+			"Assignment Portal Settings", {"enable_profiling": 1, "profiled_users": "Administrator"}
+		)
+		frappe.clear_document_cache("Assignment Portal Settings", "Assignment Portal Settings")
+
+		request = SimpleNamespace(path=f"/api/method/{ENDPOINT}")
+		# `stop` commits the log, which would outlive the test
+		with patch.object(frappe.local, "request", request, create=True), patch.object(frappe.db, "commit"):
+			profiler.start()
+			self.assertIsNotNone(profiler.get_current_profile())
+			api.build_assignments_summary()
+			profiler.stop()
+
+		self.assertIsNone(profiler.get_current_profile())
+		log = frappe.get_last_doc("Portal Profile Log", filters={"endpoint": ENDPOINT})
+		self.assertEqual(log.user, "Administrator")
+		self.assertGreater(log.sql_query_count, 0)
+		self.assertIn("build_assignments_summary", log.stats)
@@ -2,7 +2,14 @@
 // For license information, please see license.txt
 
 frappe.query_reports["FF Assignment Summary By Student"] = {
-  filters: [],
+  filters: [
+    {
+      fieldname: "force_refresh",
+      label: __("Refresh Now"),
+      fieldtype: "Check",
+      description: __("The report shows a snapshot, tick to bring it up to date first"),
+    },
+  ],
   formatter: function (value, row, column, data, default_formatter) {
     // if value is "Failed" make it red
     if (value == "Failed") {
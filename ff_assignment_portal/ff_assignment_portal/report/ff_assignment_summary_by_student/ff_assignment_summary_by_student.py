@@ -1,52 +1,201 @@
 # Copyright (c) 2023, Hussain Nagaria and contributors
 # For license information, please see license.txt
 
+"""Latest status of every student for each day.
+
+Mentors are served a snapshot kept in Redis, with an "as of" time, instead of running the
+aggregation on every open. Status changes mark their student as dirty and queue a refresh,
+which recomputes only the dirty students' rows, and a scheduled job does the same every
+minute. A refresh takes a lock, so only one aggregation runs at a time. Mentors never wait
+for it: while a refresh runs, forcing another serves the snapshot as it was. The whole
+snapshot is rebuilt once a day.
+"""
+
+from contextlib import suppress
+
 import frappe
+from frappe.query_builder import Order
+from frappe.utils import format_datetime, now_datetime
+from redis.exceptions import LockError
+
+DAYS = ("1", "2", "3", "4")
+NOT_SUBMITTED = "Not Submitted"
+
+SNAPSHOT_KEY = "ff_summary_snapshot:rows"
+SNAPSHOT_AS_OF_KEY = "ff_summary_snapshot:as_of"
+DIRTY_USERS_KEY = "ff_summary_snapshot:dirty"
+SNAPSHOT_LOCK = "ff_summary_snapshot:lock"
+SNAPSHOT_LOCK_TIMEOUT = 5 * 60
+REFRESH_METHOD = (
+	"ff_assignment_portal.ff_assignment_portal.report.ff_assignment_summary_by_student."
+	"ff_assignment_summary_by_student.refresh_snapshot"
+)
 
 
 def execute(filters=None):
-	return get_columns(), get_data(filters)
+	filters = frappe._dict(filters or {})
+	if filters.force_refresh or get_as_of() is None:
+		refresh_snapshot(requested_at=now_datetime(), wait=False)
+
+	as_of = get_as_of()
+	if as_of is None:
+		frappe.throw("The report snapshot is being built, please try again in a moment.")
+
+	return get_columns(), get_snapshot(), f"As of {format_datetime(as_of)}"
 
 
 def get_data(filters=None):
-	data = []
-	students = frappe.get_all(
-		"FF Assignment Submission",
-		fields=["user", "user.full_name"],
-		group_by="user",
-		order_by="full_name",
+	"""Computes the report from the submissions, without the snapshot"""
+	return sort_rows(build_rows().values())
+
+
+def build_rows(users: list[str] | None = None) -> dict[str, dict]:
+	"""Report rows by user, of `users` or of everyone who submitted, in one query"""
+	Submission = frappe.qb.DocType("FF Assignment Submission")
+	User = frappe.qb.DocType("User")
+	query = (
+		frappe.qb.from_(Submission)
+		.left_join(User)
+		.on(User.name == Submission.user)
+		.select(Submission.user, User.full_name, Submission.day, Submission.status)
+		.orderby(Submission.creation, order=Order.desc)
 	)
+	if users is not None:
+		if not users:
+			return {}
+		query = query.where(Submission.user.isin(users))
+
+	rows = {}
+	for user, full_name, day, status in query.run():
+		row = rows.get(user)
+		if row is None:
+			row = rows[user] = {"full_name": full_name, "user": user}
+			row.update({f"day_{d}": None for d in DAYS})
+
+		# newest first, so the first status seen for a day is the latest one
+		if day in DAYS and row[f"day_{day}"] is None:
+			row[f"day_{day}"] = status
 
-	for student in students:
-		data.append(
-			{
-				"full_name": student.full_name,
-				"user": student.user,
-				"day_1": status_for_day(student.user, "1"),
-				"day_2": status_for_day(student.user, "2"),
-				"day_3": status_for_day(student.user, "3"),
-				"day_4": status_for_day(student.user, "4"),
-			}
-		)
+	for row in rows.values():
+		for day in DAYS:
+			row[f"day_{day}"] = row[f"day_{day}"] or NOT_SUBMITTED
+		set_summaries(row)
 
-	for row in data:
-		total_submitted = 0
-		total_passed = 0
+	return rows
 
-		for day in ("1", "2", "3", "4"):
-			status = row[f"day_{day}"]
-			if has_passed(status):
-				total_passed = total_passed + 1
-				total_submitted = total_submitted + 1
-				continue
 
-			if has_submitted(status):
-				total_submitted = total_submitted + 1
+def set_summaries(row):
+	total_submitted = 0
+	total_passed = 0
 
-		row["submitted_summary"] = f"{total_submitted} / 4"
-		row["passed_summary"] = f"{total_passed} / 4"
+	for day in DAYS:
+		status = row[f"day_{day}"]
+		if has_passed(status):
+			total_passed = total_passed + 1
+			total_submitted = total_submitted + 1
+			continue
 
-	return data
+		if has_submitted(status):
+			total_submitted = total_submitted + 1
+
+	row["submitted_summary"] = f"{total_submitted} / 4"
+	row["passed_summary"] = f"{total_passed} / 4"
+
+
+def sort_rows(rows) -> list[dict]:
+	return sorted(rows, key=lambda row: (row["full_name"] or "").casefold())
+
+
+def get_snapshot() -> list[dict]:
+	cache = frappe.cache()
+	pipe = cache.pipeline()
+	pipe.hvals(cache.make_key(SNAPSHOT_KEY))
+	(rows,) = pipe.execute()
+	return sort_rows(frappe.parse_json(frappe.safe_decode(row)) for row in rows)
+
+
+def get_as_of():
+	return frappe.cache().get_value(SNAPSHOT_AS_OF_KEY)
+
+
+def refresh_snapshot(full=False, requested_at=None, wait=True):
+	"""Recomputes the rows of the dirty students, or of everyone if `full` or if there is no
+	snapshot yet. Runs every minute, and once a day with `full`, from the scheduler.
+
+	Without `wait`, as in a web request, does nothing if another refresh is running."""
+	cache = frappe.cache()
+	lock = cache.lock(
+		cache.make_key(SNAPSHOT_LOCK),
+		timeout=SNAPSHOT_LOCK_TIMEOUT,
+		blocking_timeout=SNAPSHOT_LOCK_TIMEOUT,
+	)
+	if not lock.acquire(blocking=wait):
+		if not wait:
+			return
+		frappe.throw("The report snapshot is being refreshed, please try again in a moment.")
+
+	try:
+		as_of = get_as_of()
+		# someone else refreshed it while this was waiting for the lock
+		if requested_at and as_of and as_of >= requested_at:
+			return
+
+		started_at = now_datetime()
+		dirty_users = pop_dirty_users()
+		key = cache.make_key(SNAPSHOT_KEY)
+		pipe = cache.pipeline(transaction=True)
+
+		if full or as_of is None:
+			rows = build_rows()
+			pipe.delete(key)
+		else:
+			rows = build_rows(dirty_users)
+			# students whose submissions are all gone
+			removed = set(dirty_users) - set(rows)
+			if removed:
+				pipe.hdel(key, *removed)
+
+		if rows:
+			pipe.hset(key, mapping={user: frappe.as_json(row, indent=None) for user, row in rows.items()})
+		pipe.execute()
+
+		cache.set_value(SNAPSHOT_AS_OF_KEY, started_at)
+	finally:
+		with suppress(LockError):
+			lock.release()
+
+
+def rebuild_snapshot():
+	"""Runs daily from the scheduler, catches changes no status change reported (like names)"""
+	refresh_snapshot(full=True)
+
+
+def mark_dirty(*users: str):
+	"""Queues a refresh of the rows of `users` once the current transaction commits"""
+	frappe.db.after_commit.add(lambda: queue_refresh(users))
+
+
+def queue_refresh(users):
+	cache = frappe.cache()
+	pipe = cache.pipeline()
+	pipe.sadd(cache.make_key(DIRTY_USERS_KEY), *users)
+	pipe.execute()
+
+	# one queued refresh covers every change made until it starts
+	frappe.enqueue(REFRESH_METHOD, queue="short", job_id="ff_summary_snapshot_refresh", deduplicate=True)
+
+
+def pop_dirty_users() -> list[str]:
+	cache = frappe.cache()
+	key = cache.make_key(DIRTY_USERS_KEY)
+
+	# MULTI/EXEC, so a student marked meanwhile is either popped here or kept for next time
+	pipe = cache.pipeline(transaction=True)
+	pipe.smembers(key)
+	pipe.delete(key)
+	users, _ = pipe.execute()
+
+	return [frappe.safe_decode(user) for user in users]
 
 
 def get_columns():
@@ -101,24 +250,8 @@ def get_columns():
 	]
 
 
-def status_for_day(user, day):
-	latest_submission_for_day = frappe.get_all(
-		"FF Assignment Submission",
-		filters={"user": user, "day": day},
-		pluck="status",
-		order_by="creation desc",
-		limit=1,
-	)
-
-	if latest_submission_for_day:
-		latest_submission_for_day = latest_submission_for_day[0]
-		return latest_submission_for_day
-
-	return "Not Submitted"
-
-
 def has_submitted(status):
-	return status != "Not Submitted"
+	return status != NOT_SUBMITTED
 
 
 def has_passed(status):
@@ -7,4 +7,30 @@ app_license = "APGL 3.0"
 
 website_route_rules = [{'from_route': '/assignments-portal/<path:app_path>', 'to_route': 'assignments-portal'},]
 
-export_python_type_annotations = True
\ No newline at end of file
+export_python_type_annotations = True
+
+before_job = ["ff_assignment_portal.metrics.record_queue_lag"]
+after_job = ["ff_assignment_portal.metrics.flush"]
+before_request = [
+	"ff_assignment_portal.profiler.start",
+	"ff_assignment_portal.tiering.rehydrate_requested_file",
+]
+after_request = ["ff_assignment_portal.profiler.stop", "ff_assignment_portal.metrics.flush"]
+
+after_migrate = ["ff_assignment_portal.warmup.after_migrate"]
+clear_cache = ["ff_assignment_portal.warmup.after_clear_cache"]
+
+scheduler_events = {
+	"cron": {
+		"* * * * *": [
+			"ff_assignment_portal.notifications.send_pending_notifications",
+			"ff_assignment_portal.ff_assignment_portal.report.ff_assignment_summary_by_student.ff_assignment_summary_by_student.refresh_snapshot",
+		],
+		"*/5 * * * *": ["ff_assignment_portal.code_servers.check_hosts"],
+	},
+	"hourly": ["ff_assignment_portal.similarity.compact"],
+	"daily": [
+		"ff_assignment_portal.ff_assignment_portal.report.ff_assignment_summary_by_student.ff_assignment_summary_by_student.rebuild_snapshot",
+		"ff_assignment_portal.tiering.tier_attachments",
+	],
+}
@@ -0,0 +1,193 @@
+"""Prometheus-style metrics for the checking, grading and clone pipelines.
+
+Samples are buffered in process memory and flushed to Redis in one pipelined round trip at
+the end of every request and background job, so recording a sample never does any I/O.
+The aggregated values are served in text exposition format by `export`.
+"""
+
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from threading import Lock
+
+import frappe
+from werkzeug.wrappers import Response
+
+CACHE_KEY = "ff_assignment_portal:metrics"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+METRICS = {
+	"ff_check_duration_seconds": ("histogram", "Time taken to check an assignment submission."),
+	"ff_check_rule_duration_seconds": ("histogram", "Time taken by a single assignment check rule."),
+	"ff_checks_total": ("counter", "Assignment submissions checked, by resulting status."),
+	"ff_check_rules_total": ("counter", "Check rules evaluated, by whether they ran or reused the previous attempt's outcome."),
+	"ff_zip_read_duration_seconds": ("histogram", "Time taken to read and parse a submission zip."),
+	"ff_zip_members_read_total": ("counter", "Zip members decompressed while reading submissions."),
+	"ff_archive_cache_lookups_total": ("counter", "Lookups in the extracted archive cache, by result."),
+	"ff_similarity_duration_seconds": ("histogram", "Time taken to generate a similarity score."),
+	"ff_similarity_comparisons_total": ("counter", "Submissions compared while generating similarity scores."),
+	"ff_sql_check_phase_duration_seconds": ("histogram", "Time taken by each phase of an SQL solution check."),
+	"ff_sql_verdicts_total": ("counter", "SQL solutions checked, by verdict and whether it came from the verdict cache."),
+	"ff_clone_duration_seconds": ("histogram", "Time taken to clone a submission to the code server."),
+	"ff_clones_total": ("counter", "Clones to the code server, by result."),
+	"ff_clone_objects_total": ("counter", "Files delta-synced to the code server, by whether they were sent or already there."),
+	"ff_job_queue_lag_seconds": ("histogram", "Time background jobs spent waiting in the queue."),
+	"ff_warm_up_duration_seconds": ("histogram", "Time taken to warm up the site's shared state, by what triggered it."),
+	"ff_tiering_files_total": ("counter", "Attachments moved into packs and removed from disk."),
+	"ff_tiering_blobs_total": ("counter", "Attachment contents tiered, by whether they were packed or already in a pack."),
+	"ff_tiering_bytes_total": ("counter", "Bytes of packed attachment contents, before and after compression."),
+	"ff_tiering_rehydrations_total": ("counter", "Tiered attachments restored to disk on first use."),
+}
+
+_lock = Lock()
+_counters = {}
+_histograms = {}
+
+
+def inc(name: str, value: float = 1, **labels):
+	key = (name, _label_tuple(labels))
+	with _lock:
+		_counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+	key = (name, _label_tuple(labels))
+	with _lock:
+		histogram = _histograms.get(key)
+		if histogram is None:
+			# one slot per bucket, then +Inf, sum
+			histogram = _histograms[key] = [0] * (len(DEFAULT_BUCKETS) + 2)
+
+		for i, upper_bound in enumerate(DEFAULT_BUCKETS):
+			if value <= upper_bound:
+				histogram[i] += 1
+		histogram[-2] += 1
+		histogram[-1] += value
+
+
+@contextmanager
+def timer(name: str, **labels):
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		duration = time.perf_counter() - start
+		observe(name, duration, **labels)
+
+		profile = getattr(frappe.local, "ff_profile", None)
+		if profile:
+			profile.add_section(name, labels, duration)
+
+
+def flush():
+	"""Push buffered samples to Redis. Runs as an `after_request` and `after_job` hook."""
+	global _counters, _histograms
+
+	with _lock:
+		if not _counters and not _histograms:
+			return
+		counters, histograms = _counters, _histograms
+		_counters, _histograms = {}, {}
+
+	cache = frappe.cache()
+	key = cache.make_key(CACHE_KEY)
+	pipe = cache.pipeline()
+
+	for (name, labels), value in counters.items():
+		pipe.hincrbyfloat(key, _field(name, "", labels), value)
+
+	for (name, labels), histogram in histograms.items():
+		for upper_bound, count in zip(DEFAULT_BUCKETS + ("+Inf",), histogram[:-1]):
+			pipe.hincrbyfloat(key, _field(name, "_bucket", labels, upper_bound), count)
+		pipe.hincrbyfloat(key, _field(name, "_count", labels), histogram[-2])
+		pipe.hincrbyfloat(key, _field(name, "_sum", labels), histogram[-1])
+
+	try:
+		pipe.execute()
+	except Exception:
+		# metrics must never break the request or job that recorded them
+		frappe.logger("ff_assignment_portal").exception("Failed to flush metrics")
+
+
+def record_queue_lag(method=None, kwargs=None):
+	"""`before_job` hook: record how long the job waited in the queue."""
+	from rq import get_current_job
+
+	job = get_current_job()
+	if not job or not job.enqueued_at:
+		return
+
+	kwargs = kwargs or {}
+	method = kwargs.get("doc_method") or method or ""
+	if not (str(method).startswith("ff_assignment_portal.") or kwargs.get("doctype") in _APP_DOCTYPES):
+		return
+
+	enqueued_at = job.enqueued_at
+	if enqueued_at.tzinfo is None:
+		enqueued_at = enqueued_at.replace(tzinfo=timezone.utc)
+
+	lag = (datetime.now(timezone.utc) - enqueued_at).total_seconds()
+	observe("ff_job_queue_lag_seconds", max(lag, 0), method=method, queue=job.origin)
+
+
+def render() -> str:
+	cache = frappe.cache()
+	pipe = cache.pipeline()
+	pipe.hgetall(cache.make_key(CACHE_KEY))
+	(raw,) = pipe.execute()
+
+	series = []
+	for field, value in raw.items():
+		name, suffix, labels, le = frappe.safe_decode(field).split("\t")
+		series.append((name, labels, _SUFFIX_ORDER[suffix], _le_sort_key(le), suffix, le, float(value)))
+	series.sort()
+
+	lines = []
+	current_family = None
+	for name, labels, _, _, suffix, le, value in series:
+		if name != current_family:
+			current_family = name
+			metric_type, description = METRICS.get(name, ("untyped", ""))
+			lines.append(f"# HELP {name} {description}")
+			lines.append(f"# TYPE {name} {metric_type}")
+
+		if le:
+			labels = f'{labels},le="{le}"' if labels else f'le="{le}"'
+		label_str = f"{{{labels}}}" if labels else ""
+		lines.append(f"{name}{suffix}{label_str} {_format_value(value)}")
+
+	return "\n".join(lines) + "\n"
+
+
+@frappe.whitelist()
+def export():
+	frappe.only_for("System Manager")
+	flush()
+	return Response(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+_APP_DOCTYPES = ("FF Assignment Submission", "SQL Problem Solution", "SQL Problem", "SQL Problem Set")
+_SUFFIX_ORDER = {"": 0, "_bucket": 1, "_count": 2, "_sum": 3}
+
+
+def _label_tuple(labels: dict) -> tuple:
+	return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _field(name: str, suffix: str, labels: tuple, le="") -> str:
+	label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+	return f"{name}\t{suffix}\t{label_str}\t{le}"
+
+
+def _escape(value: str) -> str:
+	return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+	return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _le_sort_key(le: str) -> float:
+	if not le:
+		return 0
+	return float("inf") if le == "+Inf" else float(le)
@@ -0,0 +1,91 @@
+"""Coalesced email notifications for submission status changes.
+
+Status changes only record the submission in Redis. A scheduled job then sends each student
+a single email covering everything that changed for them during the last `COALESCE_WINDOW`
+seconds, so regrades and floods of checker results never wait on email rendering.
+"""
+
+import time
+
+import frappe
+
+ASSIGNMENT_DOCTYPE_NAME = "FF Assignment Submission"
+COALESCE_WINDOW = 60  # seconds
+PENDING_SINCE_KEY = "ff_notifications:pending_since"
+
+
+def queue_submission_update(user: str, submission: str):
+	cache = frappe.cache()
+	pipe = cache.pipeline()
+	pipe.sadd(cache.make_key(f"ff_notifications:{user}"), submission)
+	pipe.hsetnx(cache.make_key(PENDING_SINCE_KEY), user, time.time())
+	pipe.execute()
+
+
+def queue_after_commit(user: str, submission: str):
+	frappe.db.after_commit.add(lambda: queue_submission_update(user, submission))
+
+
+def should_notify(day) -> bool:
+	return not frappe.conf.developer_mode and str(day) != "4"
+
+
+def send_pending_notifications():
+	"""Runs every minute from the scheduler"""
+	cache = frappe.cache()
+	pipe = cache.pipeline()
+	pipe.hgetall(cache.make_key(PENDING_SINCE_KEY))
+	(pending_since,) = pipe.execute()
+
+	now = time.time()
+	for user, since in pending_since.items():
+		if now - float(since) < COALESCE_WINDOW:
+			continue
+
+		user = frappe.safe_decode(user)
+		submissions = pop_pending_submissions(user)
+		if not submissions:
+			continue
+
+		try:
+			send_update_email(user, submissions)
+		except Exception:
+			frappe.log_error("Error sending notification to student", reference_doctype=ASSIGNMENT_DOCTYPE_NAME)
+
+
+def pop_pending_submissions(user: str) -> list[str]:
+	cache = frappe.cache()
+	key = cache.make_key(f"ff_notifications:{user}")
+
+	# MULTI/EXEC, so a submission queued meanwhile is either popped here or kept for next time
+	pipe = cache.pipeline(transaction=True)
+	pipe.smembers(key)
+	pipe.delete(key)
+	pipe.hdel(cache.make_key(PENDING_SINCE_KEY), user)
+	submissions, _, _ = pipe.execute()
+
+	return [frappe.safe_decode(name) for name in submissions]
+
+
+def send_update_email(user: str, submissions: list[str]):
+	updates = frappe.get_all(
+		ASSIGNMENT_DOCTYPE_NAME,
+		filters={"name": ("in", submissions)},
+		fields=["name", "day", "status", "feedback"],
+		order_by="day asc, creation asc",
+	)
+	if not updates:
+		return
+
+	days = sorted({update.day for update in updates})
+	if len(days) == 1:
+		subject = f"[Frappe School] There is an update on your submission for Day {days[0]}"
+	else:
+		subject = f"[Frappe School] There are updates on your submissions for Day {', '.join(days)}"
+
+	frappe.sendmail(
+		recipients=user,
+		subject=subject,
+		template="submission_update",
+		args={"updates": updates},
+	)
@@ -0,0 +1,175 @@
+"""Opt-in profiling of the portal's whitelisted endpoints.
+
+When enabled in Assignment Portal Settings, calls from the listed users (or a random sample
+of all calls) are profiled with cProfile and a stack sampler, their SQL queries are counted
+and timed, and the result is stored as a Portal Profile Log.
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import frappe
+
+PROFILED_METHODS = (
+	"ff_assignment_portal.api.",
+	"ff_assignment_portal.ff_assignment_portal.doctype.ff_assignment_submission.ff_assignment_submission.submit_assignment",
+)
+SAMPLING_INTERVAL = 0.005  # seconds
+ZIP_SECTIONS = ("ff_zip_read_duration_seconds",)
+SQLITE_SECTIONS = ("ff_sql_check_phase_duration_seconds",)
+
+
+class RequestProfile:
+	def __init__(self, endpoint):
+		self.endpoint = endpoint
+		self.sections = Counter()
+		self.sql_query_count = 0
+		self.sql_duration = 0
+		self.profiler = cProfile.Profile()
+		self.sampler = StackSampler(threading.get_ident())
+
+	def start(self):
+		self.started = time.perf_counter()
+		self.sampler.start()
+		self.profiler.enable()
+
+	def stop(self):
+		self.profiler.disable()
+		self.sampler.stop()
+		self.duration = time.perf_counter() - self.started
+
+	def add_section(self, name, labels, duration):
+		label = ",".join(f"{k}={v}" for k, v in labels.items())
+		self.sections[f"{name}{{{label}}}" if label else name] += duration
+
+	def section_total(self, names):
+		return sum(v for k, v in self.sections.items() if k.split("{", 1)[0] in names)
+
+	def get_stats(self, limit=60):
+		out = io.StringIO()
+		pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+		return out.getvalue()
+
+
+class StackSampler(threading.Thread):
+	"""Samples the stack of one thread at a fixed interval, like py-spy does from outside."""
+
+	def __init__(self, thread_id, interval=SAMPLING_INTERVAL):
+		super().__init__(daemon=True)
+		self.thread_id = thread_id
+		self.interval = interval
+		self.stacks = Counter()
+		self._stopped = threading.Event()
+
+	def run(self):
+		while not self._stopped.wait(self.interval):
+			frame = sys._current_frames().get(self.thread_id)
+			stack = []
+			while frame is not None:
+				code = frame.f_code
+				stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+				frame = frame.f_back
+
+			if stack:
+				self.stacks[";".join(reversed(stack))] += 1
+
+	def stop(self):
+		self._stopped.set()
+		self.join()
+
+	def folded(self):
+		return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+def get_current_profile():
+	return getattr(frappe.local, "ff_profile", None)
+
+
+def start():
+	"""`before_request` hook"""
+	endpoint = get_endpoint()
+	if not endpoint or not endpoint.startswith(PROFILED_METHODS):
+		return
+
+	if not should_profile():
+		return
+
+	profile = frappe.local.ff_profile = RequestProfile(endpoint)
+	patch_db_sql(profile)
+	profile.start()
+
+
+def stop():
+	"""`after_request` hook"""
+	profile = get_current_profile()
+	if not profile:
+		return
+
+	frappe.local.ff_profile = None
+	profile.stop()
+	frappe.db.__dict__.pop("sql", None)
+
+	try:
+		frappe.get_doc(
+			{
+				"doctype": "Portal Profile Log",
+				"endpoint": profile.endpoint,
+				"user": frappe.session.user,
+				"duration": profile.duration * 1000,
+				"sql_query_count": profile.sql_query_count,
+				"sql_duration": profile.sql_duration * 1000,
+				"zip_io_duration": profile.section_total(ZIP_SECTIONS) * 1000,
+				"sqlite_io_duration": profile.section_total(SQLITE_SECTIONS) * 1000,
+				"sections": json.dumps(
+					{k: round(v * 1000, 3) for k, v in profile.sections.most_common()}, indent=1
+				),
+				"stats": profile.get_stats(),
+				"folded_stacks": profile.sampler.folded(),
+			}
+		).insert(ignore_permissions=True)
+		# the request's own transaction has already been committed by now
+		frappe.db.commit()
+	except Exception:
+		frappe.log_error("Failed to save portal profile", reference_doctype="Portal Profile Log")
+
+
+def get_endpoint():
+	path = getattr(frappe.request, "path", "") or ""
+	if "/method/" not in path:
+		return None
+	return path.split("/method/", 1)[1].strip("/")
+
+
+def should_profile():
+	settings = frappe.get_cached_doc("Assignment Portal Settings")
+	if not settings.enable_profiling:
+		return False
+
+	profiled_users = (settings.profiled_users or "").split()
+	if frappe.session.user in profiled_users:
+		return True
+
+	return random.random() * 100 < (settings.profiling_sample_rate or 0)
+
+
+def patch_db_sql(profile):
+	original_sql = frappe.db.sql
+
+	def sql(*args, **kwargs):
+		start = time.perf_counter()
+		try:
+			return original_sql(*args, **kwargs)
+		finally:
+			profile.sql_query_count += 1
+			profile.sql_duration += time.perf_counter() - start
+
+	# shadows the bound method on this connection only, `stop` removes it again
+	frappe.db.sql = sql
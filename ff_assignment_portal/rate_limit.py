@@ -0,0 +1,70 @@
+from functools import wraps
+import time
+
+import frappe
+
+# Refill the bucket for the time passed since the last call, then try to take one token.
+# Runs atomically inside Redis, so concurrent workers always see a consistent bucket.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated_at")
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+
+local allowed = 0
+if tokens >= 1 then
+	tokens = tokens - 1
+	allowed = 1
+end
+
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated_at", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return allowed
+"""
+
+
+def rate_limit(rate: float, burst: int):
+	"""Token bucket per user and endpoint: `burst` calls at once, refilled at `rate` calls per second.
+
+	Limits can be overridden per endpoint from site config, e.g.
+	`"ff_rate_limits": {"ff_assignment_portal.api.submit_sql_solution": {"rate": 1, "burst": 20}}`
+	"""
+
+	def decorator(fn):
+		endpoint = f"{fn.__module__}.{fn.__name__}"
+
+		@wraps(fn)
+		def wrapper(*args, **kwargs):
+			limits = (frappe.conf.get("ff_rate_limits") or {}).get(endpoint) or {}
+			consume_token(endpoint, limits.get("rate", rate), limits.get("burst", burst))
+			return fn(*args, **kwargs)
+
+		return wrapper
+
+	return decorator
+
+
+def consume_token(endpoint: str, rate: float, burst: int):
+	if frappe.flags.in_test:
+		return
+
+	if not take_token(f"ff_rate_limit:{endpoint}:{frappe.session.user}", rate, burst):
+		frappe.throw(
+			"You are doing that too often. Please wait a few seconds and try again.",
+			frappe.TooManyRequestsError,
+			title="Too Many Requests",
+		)
+
+
+def take_token(key: str, rate: float, burst: int, now: float | None = None) -> bool:
+	"""Takes a token from the bucket at `key` as of `now` (a unix timestamp), False if it is empty"""
+	cache = frappe.cache()
+	allowed = cache.register_script(TOKEN_BUCKET_SCRIPT)(
+		keys=[cache.make_key(key)], args=[rate, burst, time.time() if now is None else now]
+	)
+	return bool(allowed)
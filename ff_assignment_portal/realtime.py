@@ -0,0 +1,18 @@
+"""Realtime updates of submissions, pushed to the student who owns them.
+
+The portal patches its list of submissions from these events instead of querying it again,
+so results of the checker, regrades and clones show up in every open tab without polling.
+Events are only published once the transaction commits, so a rolled back change is never
+shown.
+"""
+
+import frappe
+
+EVENT = "ff_submission_update"
+# what the portal shows of a submission
+FIELDS = ("name", "day", "status", "feedback", "submission_summary", "creation")
+
+
+def publish_submission_update(user: str, update: dict):
+	"""`update` holds the submission's name and day, and any of `FIELDS` that changed"""
+	frappe.publish_realtime(EVENT, update, user=user, after_commit=True)
@@ -0,0 +1,238 @@
+"""Signature store of passed submissions for similarity scoring across cohorts.
+
+Every file of a passed submission becomes one fixed-width record of
+`(day, digest of file name and content, digest of the user, submission name)`. Records live
+in a main file sorted by (day, file digest), which is memory-mapped and binary searched, and
+an append-only tail that new submissions go to. The tail is merged into the main file
+periodically. Records are never removed, so submissions of earlier cohorts stay comparable
+after they leave the live table, and a lookup only touches the pages holding the matching
+records.
+"""
+
+import fcntl
+import heapq
+import mmap
+import os
+from collections import defaultdict
+from contextlib import suppress
+from hashlib import md5
+
+import frappe
+from redis.exceptions import LockError
+
+RECORD_SIZE = 64
+KEY_SIZE = 17  # day + file digest
+USER_DIGEST_SIZE = 8
+NAME_SIZE = RECORD_SIZE - KEY_SIZE - USER_DIGEST_SIZE
+COMPACTION_LOCK = "ff_similarity_compaction"
+
+_store_dir = None
+
+
+def add_submission(name: str, user: str, day: str, hashes: dict):
+	"""Appends a record for every file in `hashes` ({file name: content hash}) to the tail."""
+	if not hashes:
+		return
+
+	encoded_name = name.encode()
+	if len(encoded_name) > NAME_SIZE:
+		frappe.throw(f"Submission name {name} is too long for the similarity store.")
+
+	records = b"".join(
+		make_key(day, file_name, file_hash) + user_digest(user) + encoded_name.ljust(NAME_SIZE, b"\0")
+		for file_name, file_hash in hashes.items()
+	)
+	append_to_tail(records)
+
+
+def add_after_commit(name: str, user: str, day: str, hashes: str | dict | None):
+	if isinstance(hashes, str):
+		hashes = frappe.parse_json(hashes)
+
+	frappe.db.after_commit.add(lambda: add_submission(name, user, day, hashes))
+
+
+def find_most_similar(day: str, hashes: dict, user: str) -> tuple[float, str | None, int]:
+	"""Returns the similarity score in percent, the most similar submission by another user and
+	the number of matching records looked at."""
+	if not hashes:
+		return 0, None, 0
+
+	own_digest = user_digest(user)
+	matched_files = defaultdict(set)
+	num_records = 0
+
+	keys = {make_key(day, file_name, file_hash) for file_name, file_hash in hashes.items()}
+	for record in lookup(keys):
+		num_records += 1
+		if record[KEY_SIZE : KEY_SIZE + USER_DIGEST_SIZE] == own_digest:
+			continue
+		# a submission re-added after passing again must not count twice
+		matched_files[parse_name(record)].add(record[:KEY_SIZE])
+
+	if not matched_files:
+		return 0, None, num_records
+
+	name, files = max(matched_files.items(), key=lambda item: (len(item[1]), item[0]))
+	return len(files) * 100 / len(hashes), name, num_records
+
+
+def lookup(keys: set[bytes]):
+	"""Yields the records for any of `keys` from the main file and the tail"""
+	with open_main() as main:
+		if main is not None:
+			for key in keys:
+				yield from lookup_main(main, key)
+
+	for record in iter_records(read_file(get_tail_path())):
+		if record[:KEY_SIZE] in keys:
+			yield record
+
+
+def lookup_main(main: mmap.mmap, key: bytes):
+	num_records = len(main) // RECORD_SIZE
+	low, high = 0, num_records
+	while low < high:
+		mid = (low + high) // 2
+		offset = mid * RECORD_SIZE
+		if main[offset : offset + KEY_SIZE] < key:
+			low = mid + 1
+		else:
+			high = mid
+
+	for index in range(low, num_records):
+		record = main[index * RECORD_SIZE : (index + 1) * RECORD_SIZE]
+		if record[:KEY_SIZE] != key:
+			break
+		yield record
+
+
+def compact():
+	"""Merges the tail into the main file. Runs hourly from the scheduler."""
+	cache = frappe.cache()
+	lock = cache.lock(cache.make_key(COMPACTION_LOCK), timeout=60 * 60)
+	if not lock.acquire(blocking=False):
+		return
+
+	try:
+		tail_path = get_tail_path()
+		compacting_path = f"{tail_path}.compacting"
+
+		# a tail left behind by an interrupted compaction is merged first
+		if not os.path.exists(compacting_path):
+			if not os.path.exists(tail_path):
+				return
+			os.rename(tail_path, compacting_path)
+
+		# wait for writers that still hold the renamed tail
+		with open(compacting_path, "rb") as f:
+			fcntl.flock(f, fcntl.LOCK_EX)
+			tail_records = sorted(iter_records(f.read()))
+
+		main_path = get_main_path()
+		tmp_path = f"{main_path}.tmp"
+		with open_main() as main, open(tmp_path, "wb") as out:
+			main_records = iter_records(main) if main is not None else ()
+			previous = None
+			for record in heapq.merge(main_records, tail_records):
+				if record != previous:
+					out.write(record)
+				previous = record
+
+		os.replace(tmp_path, main_path)
+		os.remove(compacting_path)
+	finally:
+		with suppress(LockError):
+			lock.release()
+
+
+def append_to_tail(records: bytes):
+	tail_path = get_tail_path()
+	while True:
+		fd = os.open(tail_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+		try:
+			fcntl.flock(fd, fcntl.LOCK_EX)
+			# compaction renamed the tail after we opened it, write to the new one instead
+			if os.path.exists(tail_path) and os.stat(tail_path).st_ino == os.fstat(fd).st_ino:
+				os.write(fd, records)
+				return
+		finally:
+			os.close(fd)
+
+
+class open_main:
+	"""Memory-maps the main file read-only, or gives None while it is empty"""
+
+	def __enter__(self):
+		self.file = None
+		self.map = None
+		try:
+			self.file = open(get_main_path(), "rb")
+		except FileNotFoundError:
+			return None
+
+		if os.fstat(self.file.fileno()).st_size == 0:
+			return None
+
+		self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		return self.map
+
+	def __exit__(self, *args):
+		if self.map is not None:
+			self.map.close()
+		if self.file is not None:
+			self.file.close()
+
+
+def iter_records(data):
+	for offset in range(0, len(data) - len(data) % RECORD_SIZE, RECORD_SIZE):
+		yield bytes(data[offset : offset + RECORD_SIZE])
+
+
+def read_file(path: str) -> bytes:
+	try:
+		with open(path, "rb") as f:
+			return f.read()
+	except FileNotFoundError:
+		return b""
+
+
+def make_key(day: str, file_name: str, file_hash: str) -> bytes:
+	return bytes([int(day)]) + md5(f"{file_name}\0{file_hash}".encode()).digest()
+
+
+def user_digest(user: str) -> bytes:
+	return md5(user.encode()).digest()[:USER_DIGEST_SIZE]
+
+
+def parse_name(record: bytes) -> str:
+	return record[KEY_SIZE + USER_DIGEST_SIZE :].rstrip(b"\0").decode()
+
+
+def get_main_path() -> str:
+	return os.path.join(get_store_dir(), "signatures.bin")
+
+
+def get_tail_path() -> str:
+	return os.path.join(get_store_dir(), "signatures.tail")
+
+
+class use_store:
+	"""Points the store at another directory for the duration, used by the benchmarks"""
+
+	def __init__(self, store_dir: str):
+		self.store_dir = store_dir
+
+	def __enter__(self):
+		global _store_dir
+		self.previous, _store_dir = _store_dir, self.store_dir
+
+	def __exit__(self, *args):
+		global _store_dir
+		_store_dir = self.previous
+
+
+def get_store_dir() -> str:
+	store_dir = _store_dir or frappe.get_site_path("private", "similarity")
+	os.makedirs(store_dir, exist_ok=True)
+	return store_dir
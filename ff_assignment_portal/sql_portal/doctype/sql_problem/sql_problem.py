@@ -1,9 +1,36 @@
 # Copyright (c) 2024, Hussain Nagaria and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
+from ff_assignment_portal import conditional
+from ff_assignment_portal.sql_portal import leaderboard, verdict_cache
+from ff_assignment_portal.sql_portal.regrade import enqueue_regrade_problem
+
 
 class SQLProblem(Document):
-	pass
+	def on_update(self):
+		self.bump_problem_sets()
+
+		if self.is_new():
+			return
+
+		if self.has_value_changed("problem_set"):
+			# the solutions to it now count towards another set
+			for problem_set in (self.get_doc_before_save().problem_set, self.problem_set):
+				if problem_set:
+					leaderboard.enqueue_rebuild(problem_set, enqueue_after_commit=True)
+
+		if self.has_value_changed("correct_query") or self.has_value_changed("consider_order"):
+			verdict_cache.invalidate(self.name)
+			enqueue_regrade_problem(self.name)
+
+	def on_trash(self):
+		verdict_cache.invalidate(self.name)
+		self.bump_problem_sets()
+
+	def bump_problem_sets(self):
+		# the portal shows the statements of the problems listed in a set
+		for problem_set in frappe.get_all("SQL Set Problem", filters={"problem": self.name}, pluck="parent"):
+			conditional.bump(conditional.problem_set(problem_set))
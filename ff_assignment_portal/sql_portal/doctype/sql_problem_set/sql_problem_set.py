@@ -1,9 +1,25 @@
 # Copyright (c) 2024, Hussain Nagaria and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
+from ff_assignment_portal import conditional
+from ff_assignment_portal.sql_portal import verdict_cache
+from ff_assignment_portal.sql_portal.regrade import enqueue_regrade_problem_set
+
 
 class SQLProblemSet(Document):
-	pass
+	def on_update(self):
+		conditional.bump(conditional.problem_set(self.name))
+
+		if self.is_new():
+			return
+
+		if self.has_value_changed("data_set") or self.has_value_changed("engine"):
+			for problem in frappe.get_all("SQL Problem", filters={"problem_set": self.name}, pluck="name"):
+				verdict_cache.invalidate(problem)
+			enqueue_regrade_problem_set(self.name)
+
+	def on_trash(self):
+		conditional.bump(conditional.problem_set(self.name))
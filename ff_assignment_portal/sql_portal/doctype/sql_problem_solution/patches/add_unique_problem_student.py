@@ -0,0 +1,8 @@
+from ff_assignment_portal.sql_portal.doctype.sql_problem_solution.sql_problem_solution import (
+	on_doctype_update,
+)
+
+
+def execute():
+	# duplicates are removed before model sync, see `remove_duplicate_attempts`
+	on_doctype_update()
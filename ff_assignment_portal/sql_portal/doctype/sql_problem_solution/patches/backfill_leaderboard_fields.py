@@ -0,0 +1,14 @@
+import frappe
+
+
+def execute():
+	"""Every stored solution was submitted at least once, correct ones count as solved when last saved."""
+	Solution = frappe.qb.DocType("SQL Problem Solution")
+
+	frappe.qb.update(Solution).set(Solution.attempts, 1).where(
+		Solution.attempts.isnull() | (Solution.attempts == 0)
+	).run()
+
+	frappe.qb.update(Solution).set(Solution.first_correct_at, Solution.modified).where(
+		(Solution.status == "Correct") & Solution.first_correct_at.isnull()
+	).run()
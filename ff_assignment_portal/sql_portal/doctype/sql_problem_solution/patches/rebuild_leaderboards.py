@@ -0,0 +1,9 @@
+import frappe
+
+from ff_assignment_portal.sql_portal import leaderboard
+
+
+def execute():
+	"""Leaderboards built before nameless students were shown as "Student N" hold part of their email address."""
+	for problem_set in frappe.get_all("SQL Problem Set", pluck="name"):
+		leaderboard.enqueue_rebuild(problem_set)
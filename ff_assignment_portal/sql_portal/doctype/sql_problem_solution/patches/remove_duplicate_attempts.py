@@ -0,0 +1,29 @@
+import frappe
+
+
+def execute():
+	# runs before model sync, which adds the unique (problem, student) constraint
+	if frappe.db.table_exists("SQL Problem Solution"):
+		remove_duplicate_attempts()
+
+
+def remove_duplicate_attempts():
+	"""Keep only the most recently modified attempt of each student for a problem."""
+	duplicates = frappe.db.sql(
+		"""
+		select problem, student
+		from `tabSQL Problem Solution`
+		group by problem, student
+		having count(*) > 1
+		""",
+		as_dict=True,
+	)
+
+	for duplicate in duplicates:
+		names = frappe.get_all(
+			"SQL Problem Solution",
+			filters={"problem": duplicate.problem, "student": duplicate.student},
+			order_by="modified desc",
+			pluck="name",
+		)
+		frappe.db.delete("SQL Problem Solution", {"name": ("in", names[1:])})
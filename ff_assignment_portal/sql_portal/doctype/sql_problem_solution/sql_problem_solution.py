@@ -5,35 +5,84 @@ import frappe
 import sqlite3
 
 from frappe.model.document import Document
+from frappe.utils import now_datetime
+
+from ff_assignment_portal import conditional, metrics
+from ff_assignment_portal.sql_portal import grader, leaderboard, sandbox, verdict_cache
 
 
 class SQLProblemSolution(Document):
 	def before_save(self):
 		self.run_check()
+		self.set_first_correct_at()
+
+	def on_update(self):
+		conditional.bump(conditional.solution_status(self.student, self.problem))
+		leaderboard.update_after_commit(self.student, self.problem)
+
+	def on_trash(self):
+		conditional.bump(conditional.solution_status(self.student, self.problem))
+		leaderboard.update_after_commit(self.student, self.problem)
+
+	def set_first_correct_at(self):
+		self.first_correct_at = get_first_correct_at(self.status, self.first_correct_at)
 
 	def run_check(self) -> None:
 		self.feedback = None
 		self.set_problem_data()
-		self.set_correct_output()
+
+		data_set_hash = self.get_data_set_hash()
+		cached = verdict_cache.get_verdict(
+			self.problem, data_set_hash, self.problem_data, self.last_submitted_query
+		)
+		if cached:
+			self.status, self.feedback = cached
+			metrics.inc("ff_sql_verdicts_total", status=self.status, cached="1")
+			return
+
+		self.grade()
+		verdict_cache.set_verdict(
+			self.problem,
+			data_set_hash,
+			self.problem_data,
+			self.last_submitted_query,
+			self.status,
+			self.feedback,
+		)
+		metrics.inc("ff_sql_verdicts_total", status=self.status, cached="0")
+
+	def grade(self):
+		self.correct_output = grader.get_cached_correct_output(
+			self.get_data_set_hash(), self.get_engine(), self.problem_data.correct_query
+		)
+		if self.correct_output is None:
+			with self.phase_timer("connect"):
+				self.get_db_cursor()
+
+			with self.phase_timer("reference_query"):
+				self.set_correct_output()
 
 		try:
-			cur = self.get_db_cursor()
-			submitted_query = self.last_submitted_query
-			cur.execute(submitted_query)
-			self.student_output = cur.fetchall()
-		except sqlite3.OperationalError as e:
-			self.feedback = f"Problem with your query: <br>{frappe.bold(e)}"
+			with self.phase_timer("student_query"):
+				# untrusted, so it runs in a sandboxed grader process
+				self.student_output = sandbox.run_query(
+					self.get_data_set_path(), self.last_submitted_query, self.get_engine()
+				)
+		except sqlite3.Error as e:
+			self.feedback = grader.query_error_feedback(e)
 			self.status = "Incorrect"
 			return
+		except sandbox.SandboxError as e:
+			# not the query's fault, so nothing is saved or cached and the student can retry
+			frappe.throw(f"{e}, please try again.", title="Grader unavailable")
 
-		if (
-			self.column_count_match()
-			and self.row_count_match()
-			and self.row_data_match()
-		):
-			self.status = "Correct"
-		else:
-			self.status = "Incorrect"
+		with self.phase_timer("compare"):
+			self.status, self.feedback = grader.verdict(
+				self.student_output, self.correct_output, self.problem_data.consider_order
+			)
+
+	def phase_timer(self, phase):
+		return metrics.timer("ff_sql_check_phase_duration_seconds", phase=phase)
 
 	def set_problem_data(self):
 		problem_name = self.problem
@@ -48,75 +97,42 @@ class SQLProblemSolution(Document):
 		cur = self.get_db_cursor()
 		cur.execute(self.problem_data.correct_query)
 		self.correct_output = cur.fetchall()
+		grader.cache_correct_output(
+			self.get_data_set_hash(), self.get_engine(), self.problem_data.correct_query, self.correct_output
+		)
 
 	def get_db_cursor(self):
 		if hasattr(self, "db_cursor"):
 			return self.db_cursor
 
-		db_path = self.get_data_set_path()
-		db_uri = (
-			f"file:{db_path}?mode=ro"
-		)  # https://docs.python.org/3/library/sqlite3.html#how-to-work-with-sqlite-uris
-		con = sqlite3.connect(db_uri, uri=True)
+		con = grader.connect(self.get_data_set_path(), self.get_engine())
 		self.db_cursor = con.cursor()
 		return self.db_cursor
 
 	def get_data_set_path(self) -> str:
-		pset_name = self.problem_data.problem_set
-
-		data_set_url = frappe.db.get_value("SQL Problem Set", pset_name, "data_set")
-		data_set_path = frappe.get_doc(
-			"File", {"file_url": data_set_url}
-		).get_full_path()
-
-		return data_set_path
-
-	def column_count_match(self) -> bool:
-		num_columns_student = get_num_columns(self.student_output)
-		num_columns_correct = get_num_columns(self.correct_output)
-
-		if num_columns_student != num_columns_correct:
-			self.feedback = f"The number of columns returned are incorrect. Your query returns {frappe.bold(num_columns_student)} columns, while expected number of columns is {frappe.bold(num_columns_correct)}."
-			return False
-
-		return True
-
-	def row_count_match(self) -> bool:
-		num_rows_student = len(self.student_output)
-		num_rows_correct = len(self.correct_output)
-
-		if num_rows_student != num_rows_correct:
-			self.feedback = f"The number of rows returned are incorrect. Your query returns {frappe.bold(num_rows_student)} rows, while expected number of rows is {frappe.bold(num_rows_correct)}."
-			return False
-
-		return True
+		return grader.get_data_set_path(self.problem_data.problem_set)
 
-	def row_data_match(self) -> bool:
-		num_rows_correct = len(self.correct_output)
-		num_columns_correct = get_num_columns(self.correct_output)
+	def get_engine(self) -> str:
+		if not hasattr(self, "_engine"):
+			self._engine = grader.get_engine(self.problem_data.problem_set)
+		return self._engine
 
-		if self.problem_data.consider_order:
-			for i in range(num_rows_correct):
-				for j in range(num_columns_correct):
-					student_cell_data = self.student_output[i][j]
-					correct_cell_data = self.correct_output[i][j]
-					if student_cell_data != correct_cell_data:
-						self.feedback = f"Incorrect Output on row {i+1}, column {j+1}. <br> Expected: {frappe.bold(correct_cell_data)}, Got: {frappe.bold(student_cell_data)}"
-						return False
+	def get_data_set_hash(self) -> str | None:
+		if not hasattr(self, "_data_set_hash"):
+			self._data_set_hash = grader.get_data_set_hash(self.problem_data.problem_set)
+		return self._data_set_hash
 
-		else:
-			if set(self.student_output) != set(self.correct_output):
-				self.feedback = "Incorrect output"
-				return False
 
-		return True
+def get_first_correct_at(status: str, first_correct_at):
+	"""Kept for as long as the stored query stays correct, regrades included"""
+	if status != "Correct":
+		return None
 
+	return first_correct_at or now_datetime()
 
-def get_num_columns(output: list) -> int:
-	num_columns = 0
-	num_rows = len(output)
 
-	if num_rows > 0:
-		num_columns = len(output[0])
+def on_doctype_update():
+	frappe.db.add_unique(
+		"SQL Problem Solution", ["problem", "student"], constraint_name="unique_problem_student"
+	)
 
-	return num_columns
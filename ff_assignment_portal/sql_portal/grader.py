@@ -0,0 +1,256 @@
+"""Running SQL solutions against a problem set's dataset and comparing them with the reference.
+
+Used both when a student submits a `SQL Problem Solution` and when existing solutions are
+regraded in bulk. Datasets run on SQLite by default, or on DuckDB when the problem set asks for
+it. DuckDB works on a read-only copy of the dataset in its own columnar format, converted once
+from the SQLite or Parquet file. Errors from either engine surface as `sqlite3.Error`, so the
+feedback logic is shared.
+"""
+
+import os
+import sqlite3
+from collections import Counter
+from collections.abc import Callable
+from contextlib import suppress
+from hashlib import sha256
+from pathlib import Path
+
+import frappe
+
+from ff_assignment_portal.sql_portal import sandbox
+
+CORRECT_OUTPUT_TTL = 24 * 60 * 60  # seconds
+MAX_CACHED_OUTPUT_ROWS = 10_000
+
+
+def get_data_set_path(problem_set: str) -> str:
+	data_set_url, engine = frappe.db.get_value("SQL Problem Set", problem_set, ["data_set", "engine"])
+	data_set_path = frappe.get_doc("File", {"file_url": data_set_url}).get_full_path()
+
+	if engine == "DuckDB" and not data_set_path.endswith(".duckdb"):
+		return get_duckdb_copy(data_set_path)
+
+	return data_set_path
+
+
+def get_data_set_hash(problem_set: str) -> str | None:
+	data_set_url = frappe.db.get_value("SQL Problem Set", problem_set, "data_set")
+	return frappe.db.get_value("File", {"file_url": data_set_url}, "content_hash")
+
+
+def get_engine(problem_set: str) -> str:
+	return frappe.db.get_value("SQL Problem Set", problem_set, "engine") or "SQLite"
+
+
+def connect(data_set_path: str, engine: str = "SQLite"):
+	if engine == "DuckDB":
+		return connect_duckdb(data_set_path)
+
+	# https://docs.python.org/3/library/sqlite3.html#how-to-work-with-sqlite-uris
+	return sqlite3.connect(f"file:{data_set_path}?mode=ro", uri=True)
+
+
+def connect_duckdb(data_set_path: str):
+	con = import_duckdb().connect(data_set_path, read_only=True)
+	# queries must not read or attach any other file on the server
+	con.execute("SET enable_external_access = false")
+	con.execute("SET lock_configuration = true")
+	return con
+
+
+def get_duckdb_copy(data_set_path: str) -> str:
+	"""Returns the path of a DuckDB database holding the tables of the SQLite or Parquet file."""
+	stat = os.stat(data_set_path)
+	key = sha256(f"{data_set_path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+	cache_dir = frappe.get_site_path("duckdb_data_sets")
+	copy_path = os.path.join(cache_dir, f"{key}.duckdb")
+	if os.path.exists(copy_path):
+		return copy_path
+
+	os.makedirs(cache_dir, exist_ok=True)
+	tmp_path = f"{copy_path}.{os.getpid()}.tmp"
+	path_literal = "'" + data_set_path.replace("'", "''") + "'"
+
+	duckdb = import_duckdb()
+	try:
+		con = duckdb.connect(tmp_path)
+		try:
+			if data_set_path.endswith(".parquet"):
+				table = Path(data_set_path).stem.replace('"', '""')
+				con.execute(f'CREATE TABLE "{table}" AS SELECT * FROM read_parquet({path_literal})')
+			else:
+				con.execute(f"ATTACH {path_literal} AS data_set (TYPE SQLITE, READ_ONLY)")
+				tables = con.execute(
+					"SELECT table_name FROM information_schema.tables "
+					"WHERE table_catalog = 'data_set' AND table_type = 'BASE TABLE'"
+				).fetchall()
+				for (table,) in tables:
+					table = table.replace('"', '""')
+					con.execute(f'CREATE TABLE "{table}" AS SELECT * FROM data_set."{table}"')
+				con.execute("DETACH data_set")
+		finally:
+			con.close()
+
+		# workers converting the same dataset at once all end up with an identical copy
+		os.replace(tmp_path, copy_path)
+	except duckdb.Error as e:
+		frappe.throw(f"Unable to load the dataset into DuckDB: {e}")
+	finally:
+		# only left behind if the conversion failed
+		with suppress(FileNotFoundError):
+			os.remove(tmp_path)
+
+	return copy_path
+
+
+def import_duckdb():
+	try:
+		import duckdb
+	except ImportError:
+		frappe.throw(
+			"The DuckDB engine needs the duckdb package, install it with <code>bench pip install duckdb</code>."
+		)
+
+	return duckdb
+
+
+def get_engine_errors() -> tuple[type[Exception], ...]:
+	try:
+		import duckdb
+	except ImportError:
+		return (sqlite3.Error,)
+
+	return (sqlite3.Error, duckdb.Error)
+
+
+def run_query(con, query: str) -> list:
+	cur = con.cursor()
+	try:
+		cur.execute(query)
+		return cur.fetchall()
+	except get_engine_errors() as e:
+		raise as_sqlite_error(e) from e
+	finally:
+		cur.close()
+
+
+def get_correct_output(
+	data_set_path: str, correct_query: str, engine: str = "SQLite", data_set_hash: str | None = None
+) -> list:
+	"""Returns the output of the reference query, from the cache if it ran on this dataset before."""
+	correct_output = get_cached_correct_output(data_set_hash, engine, correct_query)
+	if correct_output is None:
+		correct_output = run_query(connect(data_set_path, engine), correct_query)
+		cache_correct_output(data_set_hash, engine, correct_query, correct_output)
+
+	return correct_output
+
+
+def get_cached_correct_output(data_set_hash: str | None, engine: str, correct_query: str) -> list | None:
+	if not data_set_hash:
+		return None
+
+	return frappe.cache().get_value(get_correct_output_key(data_set_hash, engine, correct_query))
+
+
+def cache_correct_output(data_set_hash: str | None, engine: str, correct_query: str, correct_output: list):
+	# keyed by the dataset's content, so a new dataset or query never sees a stale output
+	if not data_set_hash or len(correct_output) > MAX_CACHED_OUTPUT_ROWS:
+		return
+
+	frappe.cache().set_value(
+		get_correct_output_key(data_set_hash, engine, correct_query),
+		correct_output,
+		expires_in_sec=CORRECT_OUTPUT_TTL,
+	)
+
+
+def get_correct_output_key(data_set_hash: str, engine: str, correct_query: str) -> str:
+	digest = sha256(f"{data_set_hash}\0{engine}\0{correct_query}".encode()).hexdigest()
+	return f"ff_sql_correct_output:{digest}"
+
+
+def as_sqlite_error(error: Exception) -> sqlite3.Error:
+	if isinstance(error, sqlite3.Error):
+		return error
+
+	return sqlite3.OperationalError(str(error))
+
+
+def evaluate(
+	data_set_path: str,
+	query: str,
+	correct_output: list,
+	consider_order: bool,
+	engine: str = "SQLite",
+	run_query: Callable[[str, str, str], list] | None = None,
+) -> tuple[str, str | None]:
+	"""Returns the status and feedback for a submitted `query`, run in the sandbox.
+
+	`run_query` is a `sandbox.get_runner()` to use instead of `sandbox.run_query`, for threads
+	without a Frappe context. `sandbox.SandboxError` is passed on, the query gets no verdict
+	when the grader gives up.
+	"""
+	try:
+		student_output = (run_query or sandbox.run_query)(data_set_path, query, engine)
+	except sqlite3.Error as e:
+		return "Incorrect", query_error_feedback(e)
+
+	return verdict(student_output, correct_output, consider_order)
+
+
+def verdict(student_output: list, correct_output: list, consider_order: bool) -> tuple[str, str | None]:
+	feedback = get_mismatch_feedback(student_output, correct_output, consider_order)
+	return ("Incorrect", feedback) if feedback else ("Correct", None)
+
+
+def query_error_feedback(error: Exception) -> str:
+	return f"Problem with your query: <br>{frappe.bold(error)}"
+
+
+def get_mismatch_feedback(student_output: list, correct_output: list, consider_order: bool) -> str | None:
+	"""Returns why `student_output` differs from `correct_output`, or None if they match."""
+	num_columns_student = get_num_columns(student_output)
+	num_columns_correct = get_num_columns(correct_output)
+
+	if num_columns_student != num_columns_correct:
+		return f"The number of columns returned are incorrect. Your query returns {frappe.bold(num_columns_student)} columns, while expected number of columns is {frappe.bold(num_columns_correct)}."
+
+	num_rows_student = len(student_output)
+	num_rows_correct = len(correct_output)
+
+	if num_rows_student != num_rows_correct:
+		return f"The number of rows returned are incorrect. Your query returns {frappe.bold(num_rows_student)} rows, while expected number of rows is {frappe.bold(num_rows_correct)}."
+
+	if consider_order:
+		for i in range(num_rows_correct):
+			for j in range(num_columns_correct):
+				student_cell_data = student_output[i][j]
+				correct_cell_data = correct_output[i][j]
+				if student_cell_data != correct_cell_data:
+					return f"Incorrect Output on row {i+1}, column {j+1}. <br> Expected: {frappe.bold(correct_cell_data)}, Got: {frappe.bold(student_cell_data)}"
+
+	# rows can repeat, so they are counted rather than collected in a set
+	elif Counter(map(as_hashable, student_output)) != Counter(map(as_hashable, correct_output)):
+		return "Incorrect output"
+
+	return None
+
+
+def as_hashable(value):
+	"""`value` with the lists and dicts DuckDB returns for LIST, STRUCT and MAP values as tuples"""
+	if isinstance(value, (list, tuple)):
+		return tuple(as_hashable(item) for item in value)
+	if isinstance(value, dict):
+		return tuple((key, as_hashable(item)) for key, item in value.items())
+	return value
+
+
+def get_num_columns(output: list) -> int:
+	num_columns = 0
+	num_rows = len(output)
+
+	if num_rows > 0:
+		num_columns = len(output[0])
+
+	return num_columns
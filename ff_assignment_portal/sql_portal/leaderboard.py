@@ -0,0 +1,258 @@
+"""Per-set SQL progress and leaderboards for the live class dashboards.
+
+A student's progress in a problem set is the number of its problems they have solved, the
+attempts made across all of them and when they solved the last of those. Each set has a Redis
+sorted set of its students, scored so that more solves rank higher and equal solves rank by
+who got there first, next to a hash with everyone's progress. Ranks and top N are therefore
+O(log n) reads that never touch the solution table.
+
+Whenever a solution changes, only that student's entry in that set is recomputed, after the
+commit, from their solutions to the set's problems. Regrades do the same for the students
+whose verdicts changed. Lost keys and problems moved to another set rebuild the whole set in
+a background job, reads are answered from the database until it is done.
+"""
+
+import json
+from contextlib import suppress
+
+import frappe
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Count, Max, Sum
+from frappe.utils import add_to_date, get_datetime, now_datetime
+from redis.exceptions import LockError
+
+SOLUTION_DOCTYPE_NAME = "SQL Problem Solution"
+DEFAULT_TOP = 10
+MAX_TOP = 100
+# more solves always outweigh an earlier finish, unix timestamps stay below this
+SOLVED_WEIGHT = 10**10
+# hash field marking a complete set, no user is named ""
+BUILT_FIELD = ""
+# how far back a rebuild looks for solutions saved while it ran, longer than any request
+CATCH_UP_WINDOW = 5 * 60  # seconds
+REBUILD_LOCK_TIMEOUT = 10 * 60
+
+
+def update_after_commit(student: str, problem: str):
+	def update():
+		problem_set = frappe.db.get_value("SQL Problem", problem, "problem_set")
+		if problem_set:
+			update_students(problem_set, [student])
+
+	frappe.db.after_commit.add(update)
+
+
+def update_students(problem_set: str, students: list[str]):
+	"""Recomputes the progress of `students` in the set from their committed solutions"""
+	cache = frappe.cache()
+	pipe = cache.pipeline()
+	pipe.hlen(cache.make_key(get_stats_key(problem_set)))
+	pipe.zcard(cache.make_key(get_ranking_key(problem_set)))
+	if not is_built(*pipe.execute()):
+		# the pending rebuild picks these students up
+		enqueue_rebuild(problem_set)
+		return
+
+	write(problem_set, get_progress(problem_set, students), students)
+
+
+def get_leaderboard(problem_set: str, student: str, limit: int = DEFAULT_TOP) -> dict:
+	"""The top `limit` students of the set, and the rank and progress of `student`"""
+	cache = frappe.cache()
+	ranking_key = cache.make_key(get_ranking_key(problem_set))
+	stats_key = cache.make_key(get_stats_key(problem_set))
+
+	pipe = cache.pipeline()
+	pipe.zrevrange(ranking_key, 0, limit - 1, withscores=True)
+	pipe.zscore(ranking_key, student)
+	pipe.hlen(stats_key)
+	pipe.zcard(ranking_key)
+	top, score, num_fields, num_students = pipe.execute()
+
+	if not is_built(num_fields, num_students):
+		enqueue_rebuild(problem_set)
+		return get_leaderboard_from_database(problem_set, student, limit)
+
+	students = [member.decode() for member, _ in top]
+	pipe = cache.pipeline()
+	if students:
+		pipe.hmget(stats_key, students)
+	if score is not None:
+		pipe.hget(stats_key, student)
+		pipe.zcount(ranking_key, f"({score}", "+inf")
+	results = pipe.execute()
+
+	stats = results.pop(0) if students else []
+	leaderboard = frappe._dict(top=[], me=None, total=num_students)
+	rank, previous_score = 0, None
+	for i, (progress, (_, top_score)) in enumerate(zip(stats, top)):
+		# equal scores share the rank of the first of them
+		if top_score != previous_score:
+			rank, previous_score = i + 1, top_score
+
+		# removed between the two round trips
+		if progress is not None:
+			leaderboard.top.append(frappe._dict(json.loads(progress), rank=rank))
+
+	if score is not None:
+		progress, num_ahead = results
+		if progress is not None:
+			leaderboard.me = frappe._dict(json.loads(progress), rank=num_ahead + 1)
+
+	return leaderboard
+
+
+def get_leaderboard_from_database(problem_set: str, student: str, limit: int) -> dict:
+	ranking = sorted(get_progress(problem_set).values(), key=get_score, reverse=True)
+	leaderboard = frappe._dict(top=[], me=None, total=len(ranking))
+
+	rank, previous_score = 0, None
+	for i, progress in enumerate(ranking):
+		score = get_score(progress)
+		if score != previous_score:
+			rank, previous_score = i + 1, score
+
+		if i < limit:
+			leaderboard.top.append(frappe._dict(progress, rank=rank))
+		if progress.student == student:
+			leaderboard.me = frappe._dict(progress, rank=rank)
+
+	return leaderboard
+
+
+def get_progress(problem_set: str, students: list[str] | None = None) -> dict[str, frappe._dict]:
+	"""Progress in the set by student, of `students` or everyone who attempted it"""
+	Problem = frappe.qb.DocType("SQL Problem")
+	Solution = frappe.qb.DocType(SOLUTION_DOCTYPE_NAME)
+	User = frappe.qb.DocType("User")
+	is_correct = Solution.status == "Correct"
+
+	query = (
+		frappe.qb.from_(Problem)
+		.join(Solution)
+		.on(Solution.problem == Problem.name)
+		.left_join(User)
+		.on(User.name == Solution.student)
+		.select(
+			Solution.student,
+			User.full_name,
+			Count(Case().when(is_correct, 1)).as_("solved"),
+			Sum(Solution.attempts).as_("attempts"),
+			Max(Case().when(is_correct, Solution.first_correct_at)).as_("finished_at"),
+		)
+		.where(Problem.problem_set == problem_set)
+		.groupby(Solution.student, User.full_name)
+	)
+	if students is not None:
+		query = query.where(Solution.student.isin(students))
+
+	return {
+		row.student: frappe._dict(
+			student=row.student,
+			full_name=row.full_name,
+			solved=int(row.solved or 0),
+			attempts=int(row.attempts or 0),
+			finished_at=str(row.finished_at) if row.finished_at else None,
+		)
+		for row in query.run(as_dict=True)
+	}
+
+
+def get_score(progress: dict) -> float:
+	if not progress["solved"]:
+		return 0
+
+	finished_at = int(get_datetime(progress["finished_at"]).timestamp())
+	return progress["solved"] * SOLVED_WEIGHT - finished_at
+
+
+def write(problem_set: str, progress: dict[str, dict], students: list[str]):
+	"""Replaces the entries of `students`, those without `progress` are removed"""
+	cache = frappe.cache()
+	ranking_key = cache.make_key(get_ranking_key(problem_set))
+	stats_key = cache.make_key(get_stats_key(problem_set))
+
+	# one MULTI/EXEC, readers never see the ranking and the hash disagree
+	pipe = cache.pipeline()
+	for student in students:
+		if student in progress:
+			pipe.zadd(ranking_key, {student: get_score(progress[student])})
+			pipe.hset(stats_key, student, frappe.as_json(progress[student], indent=None))
+		else:
+			pipe.zrem(ranking_key, student)
+			pipe.hdel(stats_key, student)
+	pipe.execute()
+
+
+def enqueue_rebuild(problem_set: str, enqueue_after_commit: bool = False):
+	frappe.enqueue(
+		"ff_assignment_portal.sql_portal.leaderboard.rebuild",
+		problem_set=problem_set,
+		job_id=f"ff_leaderboard_rebuild:{problem_set}",
+		deduplicate=True,
+		enqueue_after_commit=enqueue_after_commit,
+	)
+
+
+def rebuild(problem_set: str):
+	cache = frappe.cache()
+	lock = cache.lock(
+		cache.make_key(f"ff_leaderboard_rebuild:{problem_set}"), timeout=REBUILD_LOCK_TIMEOUT
+	)
+	if not lock.acquire(blocking=False):
+		return
+
+	try:
+		started = now_datetime()
+		progress = get_progress(problem_set)
+
+		ranking_key = cache.make_key(get_ranking_key(problem_set))
+		stats_key = cache.make_key(get_stats_key(problem_set))
+		pipe = cache.pipeline()
+		pipe.delete(ranking_key, stats_key)
+		if progress:
+			pipe.zadd(ranking_key, {student: get_score(row) for student, row in progress.items()})
+			pipe.hset(
+				stats_key,
+				mapping={student: frappe.as_json(row, indent=None) for student, row in progress.items()},
+			)
+		pipe.hset(stats_key, BUILT_FIELD, str(started))
+		pipe.execute()
+
+		# solutions committed while the set was read are missing from it, or were overwritten
+		frappe.db.rollback()
+		students = get_students_changed_since(
+			problem_set, add_to_date(started, seconds=-CATCH_UP_WINDOW)
+		)
+		if students:
+			write(problem_set, get_progress(problem_set, students), students)
+	finally:
+		with suppress(LockError):
+			lock.release()
+
+
+def get_students_changed_since(problem_set: str, since) -> list[str]:
+	Problem = frappe.qb.DocType("SQL Problem")
+	Solution = frappe.qb.DocType(SOLUTION_DOCTYPE_NAME)
+	return (
+		frappe.qb.from_(Problem)
+		.join(Solution)
+		.on(Solution.problem == Problem.name)
+		.select(Solution.student)
+		.distinct()
+		.where((Problem.problem_set == problem_set) & (Solution.modified >= since))
+		.run(pluck=True)
+	)
+
+
+def is_built(num_fields: int, num_students: int) -> bool:
+	# either key on its own can be evicted, the built marker is the one extra field
+	return num_fields == num_students + 1
+
+
+def get_ranking_key(problem_set: str) -> str:
+	return f"ff_leaderboard:{problem_set}"
+
+
+def get_stats_key(problem_set: str) -> str:
+	return f"ff_leaderboard_progress:{problem_set}"
@@ -0,0 +1,143 @@
+"""Regrading of stored SQL solutions after a problem or its dataset changes.
+
+The reference query runs once per problem. Stored queries are then re-evaluated in batches,
+dispatched from a thread pool to the sandboxed grader processes so they run on all cores, and
+only changed verdicts are written back, with one bulk update per batch. Students whose
+verdicts changed get their leaderboard entries recomputed.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+
+from ff_assignment_portal import conditional
+from ff_assignment_portal.sql_portal import grader, leaderboard, sandbox
+from ff_assignment_portal.sql_portal.doctype.sql_problem_solution.sql_problem_solution import (
+	get_first_correct_at,
+)
+
+SOLUTION_DOCTYPE_NAME = "SQL Problem Solution"
+BATCH_SIZE = 500
+
+
+def enqueue_regrade_problem(problem: str):
+	frappe.enqueue(
+		"ff_assignment_portal.sql_portal.regrade.regrade_problem",
+		problem=problem,
+		queue="long",
+		timeout=60 * 60,
+		enqueue_after_commit=True,
+	)
+
+
+def enqueue_regrade_problem_set(problem_set: str):
+	frappe.enqueue(
+		"ff_assignment_portal.sql_portal.regrade.regrade_problem_set",
+		problem_set=problem_set,
+		queue="long",
+		timeout=60 * 60,
+		enqueue_after_commit=True,
+	)
+
+
+def regrade_problem_set(problem_set: str):
+	for problem in frappe.get_all("SQL Problem", filters={"problem_set": problem_set}, pluck="name"):
+		regrade_problem(problem)
+
+
+def regrade_problem(problem: str):
+	problem_data = frappe.db.get_value(
+		"SQL Problem", problem, ["correct_query", "consider_order", "problem_set"], as_dict=True
+	)
+	if not problem_data:
+		return
+
+	data_set_path = grader.get_data_set_path(problem_data.problem_set)
+	engine = grader.get_engine(problem_data.problem_set)
+	correct_output = grader.get_correct_output(
+		data_set_path,
+		problem_data.correct_query,
+		engine,
+		grader.get_data_set_hash(problem_data.problem_set),
+	)
+
+	total = frappe.db.count(SOLUTION_DOCTYPE_NAME, {"problem": problem})
+	done = 0
+	changed = 0
+
+	# the pool's threads have no Frappe context, so they get the site's sandbox settings from here
+	run_query = sandbox.get_runner()
+
+	def evaluate(query):
+		try:
+			return grader.evaluate(
+				data_set_path,
+				query or "",
+				correct_output,
+				problem_data.consider_order,
+				engine,
+				run_query=run_query,
+			)
+		except sandbox.SandboxError:
+			# says nothing about the stored query, its verdict is kept
+			return None
+
+	num_workers = frappe.conf.get("ff_sql_sandbox_workers") or os.cpu_count() or 1
+	with ThreadPoolExecutor(max_workers=num_workers) as executor:
+		for batch in iter_solution_batches(problem):
+			verdicts = executor.map(evaluate, [solution.last_submitted_query for solution in batch])
+
+			updates = {}
+			students = []
+			for solution, result in zip(batch, verdicts):
+				if result is None:
+					continue
+
+				status, feedback = result
+				if solution.status != status or (solution.feedback or None) != feedback:
+					updates[solution.name] = {
+						"status": status,
+						"feedback": feedback,
+						"first_correct_at": get_first_correct_at(status, solution.first_correct_at),
+					}
+					conditional.bump(conditional.solution_status(solution.student, problem))
+					if solution.status != status:
+						students.append(solution.student)
+
+			if updates:
+				frappe.db.bulk_update(SOLUTION_DOCTYPE_NAME, updates)
+				frappe.db.commit()
+
+			if students:
+				leaderboard.update_students(problem_data.problem_set, students)
+
+			done += len(batch)
+			changed += len(updates)
+			frappe.publish_progress(
+				done * 100 / max(total, done),
+				title="Regrading solutions",
+				doctype="SQL Problem",
+				docname=problem,
+				description=f"{done} of {total} solutions regraded, {changed} changed",
+			)
+
+	return changed
+
+
+def iter_solution_batches(problem: str):
+	"""Keyset-paginated batches of the solutions to `problem`"""
+	last_name = ""
+	while True:
+		batch = frappe.get_all(
+			SOLUTION_DOCTYPE_NAME,
+			filters={"problem": problem, "name": (">", last_name)},
+			fields=["name", "student", "last_submitted_query", "status", "feedback", "first_correct_at"],
+			order_by="name asc",
+			limit=BATCH_SIZE,
+		)
+		if not batch:
+			return
+
+		yield batch
+		last_name = batch[-1].name
@@ -0,0 +1,194 @@
+"""Running untrusted student SQL in a pool of sandboxed grader processes.
+
+Each worker process keeps its read-only dataset connections open between queries, runs
+under an address-space limit and streams result rows back over a pipe. The caller waits
+at most `get_timeout()` seconds: a query that takes longer gets its worker killed and
+replaced, so a runaway query never ties up a web or background worker. Queries from several
+threads (see `regrade`) run on separate processes, so grading scales with cores instead of
+being bound by one interpreter's GIL.
+
+Errors raised by sqlite in a worker are re-raised here with the same class and message, so
+students see exactly the feedback they would get from an in-process query.
+"""
+
+import functools
+import multiprocessing
+import os
+import queue
+import resource
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+
+import frappe
+
+DEFAULT_TIMEOUT = 5  # seconds
+DEFAULT_MEMORY_LIMIT = 512  # MB
+CHUNK_ROWS = 1000
+MAX_ROWS = 500_000
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class SandboxError(Exception):
+	"""The grader could not answer, which says nothing about whether the query is correct"""
+
+
+class QueryTimeout(SandboxError):
+	pass
+
+
+def run_query(data_set_path: str, query: str, engine: str = "SQLite") -> list:
+	"""Returns all rows of `query` run against the dataset.
+
+	Raises `sqlite3.Error` if the query fails, and `SandboxError` if the grader gave up on it.
+	"""
+	return get_runner()(data_set_path, query, engine)
+
+
+def get_runner() -> Callable[[str, str, str], list]:
+	"""`run_query` with the site's settings read now.
+
+	The returned function does not touch `frappe.local`, so it can be called from threads
+	that have no Frappe context, like the ones `regrade` runs queries from.
+	"""
+	if not frappe.conf.get("ff_sql_sandbox", 1):
+		from ff_assignment_portal.sql_portal import grader
+
+		return lambda data_set_path, query, engine: grader.run_query(
+			grader.connect(data_set_path, engine), query
+		)
+
+	return functools.partial(get_pool().run_query, timeout=get_timeout())
+
+
+def get_pool() -> "SandboxPool":
+	global _pool
+
+	with _pool_lock:
+		# a pool is only usable by the process that started it, not by forks of it
+		if _pool is None or _pool.pid != os.getpid():
+			_pool = SandboxPool(
+				frappe.conf.get("ff_sql_sandbox_workers") or os.cpu_count() or 1, get_memory_limit()
+			)
+		return _pool
+
+
+def get_timeout() -> float:
+	return frappe.conf.get("ff_sql_query_timeout") or DEFAULT_TIMEOUT
+
+
+def get_memory_limit() -> int:
+	return (frappe.conf.get("ff_sql_memory_limit") or DEFAULT_MEMORY_LIMIT) * 1024 * 1024
+
+
+class SandboxPool:
+	def __init__(self, size: int, memory_limit: int):
+		self.pid = os.getpid()
+		self.memory_limit = memory_limit
+		# workers are started from a clean server process, they inherit no sockets or threads
+		self.context = multiprocessing.get_context("forkserver")
+		self.size = size
+		self.idle = queue.LifoQueue()
+		for _ in range(size):
+			# started lazily, on first use
+			self.idle.put(None)
+
+	def run_query(self, data_set_path: str, query: str, engine: str, timeout: float) -> list:
+		worker = self.idle.get()
+		try:
+			if worker is None or not worker.is_alive():
+				worker = SandboxWorker(self.context, self.memory_limit)
+
+			try:
+				return worker.run_query(data_set_path, query, engine, timeout)
+			except QueryTimeout:
+				worker.kill()
+				worker = None
+				raise
+			except (EOFError, OSError) as e:
+				# the worker died, most likely by running out of memory
+				worker.kill()
+				worker = None
+				raise SandboxError("Your query stopped the grader unexpectedly") from e
+		finally:
+			self.idle.put(worker)
+
+
+
+class SandboxWorker:
+	def __init__(self, context, memory_limit: int):
+		self.conn, child_conn = context.Pipe()
+		self.process = context.Process(target=serve, args=(child_conn, memory_limit), daemon=True)
+		self.process.start()
+		child_conn.close()
+
+	def is_alive(self) -> bool:
+		return self.process.is_alive()
+
+	def run_query(self, data_set_path: str, query: str, engine: str, timeout: float) -> list:
+		self.conn.send((data_set_path, query, engine))
+		deadline = time.monotonic() + timeout
+		rows = []
+
+		while True:
+			remaining = deadline - time.monotonic()
+			if remaining <= 0 or not self.conn.poll(remaining):
+				raise QueryTimeout(f"Your query took longer than {timeout} seconds and was stopped")
+
+			kind, payload = self.conn.recv()
+			if kind == "rows":
+				rows.extend(payload)
+			elif kind == "done":
+				return rows
+			else:
+				error_class, message = payload
+				error_class = getattr(sqlite3, error_class, None)
+				if not (isinstance(error_class, type) and issubclass(error_class, sqlite3.Error)):
+					error_class = sqlite3.Error
+				raise error_class(message)
+
+	def kill(self):
+		self.process.kill()
+		self.process.join()
+		self.conn.close()
+
+
+def serve(conn, memory_limit: int):
+	"""Worker process loop, answers one query at a time until the pipe is closed"""
+	from ff_assignment_portal.sql_portal.grader import as_sqlite_error, connect, get_engine_errors
+
+	resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+	connections = {}
+	engine_errors = get_engine_errors()
+
+	while True:
+		try:
+			data_set_path, query, engine = conn.recv()
+		except EOFError:
+			return
+
+		try:
+			if (engine, data_set_path) not in connections:
+				connections[engine, data_set_path] = connect(data_set_path, engine)
+
+			cur = connections[engine, data_set_path].cursor()
+			try:
+				cur.execute(query)
+				num_rows = 0
+				while rows := cur.fetchmany(CHUNK_ROWS):
+					num_rows += len(rows)
+					if num_rows > MAX_ROWS:
+						raise sqlite3.OperationalError(f"Your query returned more than {MAX_ROWS} rows")
+					conn.send(("rows", rows))
+			finally:
+				cur.close()
+
+			conn.send(("done", None))
+		except engine_errors as e:
+			e = as_sqlite_error(e)
+			conn.send(("error", (type(e).__name__, str(e))))
+		except MemoryError:
+			conn.send(("error", ("OperationalError", "Your query used too much memory")))
@@ -0,0 +1,60 @@
+# Copyright (c) 2024, Hussain Nagaria and Contributors
+# See license.txt
+
+from pathlib import Path
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ff_assignment_portal.api import get_sql_leaderboard
+
+STUDENT = "roll-2024-017@example.com"
+
+
+class TestLeaderboard(FrappeTestCase):
+	def setUp(self):
+		test_db_path = Path(frappe.get_app_path("ff_assignment_portal")) / "test.db"
+		file_doc = frappe.get_doc(
+			{
+				"doctype": "File",
+				"file_name": "test_db",
+				"content": open(test_db_path, "rb").read(),
+			}
+		).insert()
+
+		# a set of its own, the leaderboard in Redis outlives the test's rollback
+		test_pset = frappe.new_doc("SQL Problem Set")
+		test_pset.name = f"test-leaderboard-{frappe.generate_hash(length=8)}"
+		test_pset.data_set = file_doc.file_url
+		test_pset.insert()
+
+		self.test_problem = frappe.get_doc(
+			{
+				"doctype": "SQL Problem",
+				"problem_set": test_pset.name,
+				"correct_query": "SELECT ID FROM testTable",
+			}
+		).insert()
+		self.test_pset = test_pset
+
+	def test_student_without_full_name(self):
+		if not frappe.db.exists("User", STUDENT):
+			frappe.get_doc({"doctype": "User", "email": STUDENT, "first_name": "Roll"}).insert(
+				ignore_permissions=True
+			)
+		frappe.db.set_value("User", STUDENT, "full_name", None)
+
+		frappe.get_doc(
+			{
+				"doctype": "SQL Problem Solution",
+				"student": STUDENT,
+				"problem": self.test_problem.name,
+				"last_submitted_query": "SELECT ID FROM testTable",
+			}
+		).insert()
+
+		board = get_sql_leaderboard(self.test_pset.name)
+		self.assertEqual(len(board.top), 1)
+		self.assertEqual(board.top[0].full_name, "Student 1")
+		self.assertFalse(board.top[0].is_me)
+		self.assertNotIn(STUDENT.split("@")[0], frappe.as_json(board))
@@ -0,0 +1,61 @@
+# Copyright (c) 2024, Hussain Nagaria and Contributors
+# See license.txt
+
+from pathlib import Path
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ff_assignment_portal.sql_portal import regrade
+
+
+class TestRegrade(FrappeTestCase):
+	def setUp(self):
+		test_pset = frappe.new_doc("SQL Problem Set")
+		test_pset.name = "test-regrade-pset"
+
+		test_db_path = Path(frappe.get_app_path("ff_assignment_portal")) / "test.db"
+		file_doc = frappe.get_doc(
+			{
+				"doctype": "File",
+				"file_name": "test_db",
+				"content": open(test_db_path, "rb").read(),
+			}
+		).insert()
+
+		test_pset.data_set = file_doc.file_url
+		test_pset.insert(ignore_if_duplicate=True)
+
+		self.test_pset = test_pset
+
+	def test_regrade_problem(self):
+		problem = frappe.get_doc(
+			{
+				"doctype": "SQL Problem",
+				"problem_set": self.test_pset.name,
+				"correct_query": "SELECT ID FROM testTable",
+			}
+		).insert()
+		solution = frappe.get_doc(
+			{
+				"doctype": "SQL Problem Solution",
+				"student": "Administrator",
+				"problem": problem.name,
+				"last_submitted_query": "SELECT ID FROM testTable WHERE ID > 1",
+			}
+		).insert()
+		self.assertEqual(solution.status, "Incorrect")
+
+		# bypasses `on_update`, the regrade runs here rather than in a background job
+		frappe.db.set_value(
+			"SQL Problem", problem.name, "correct_query", "SELECT ID FROM testTable LIMIT 2 OFFSET 1"
+		)
+
+		# student queries run from a thread pool, through the sandbox
+		with patch.dict(frappe.local.conf, {"ff_sql_sandbox": 1}):
+			self.assertEqual(regrade.regrade_problem(problem.name), 1)
+
+		solution.reload()
+		self.assertEqual(solution.status, "Correct")
+		self.assertIsNotNone(solution.first_correct_at)
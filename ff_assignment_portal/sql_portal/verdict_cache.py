@@ -0,0 +1,150 @@
+"""Memoized verdicts for SQL solutions.
+
+Verdicts are keyed by the problem, its dataset's content hash, its reference query and the
+normalized student query, so textually different but equivalent submissions (whitespace,
+keyword case, comments, trailing semicolons) are graded once. Entries live in Redis, one hash
+per problem, and each problem keeps at most `MAX_ENTRIES_PER_PROBLEM` of its most recently
+used verdicts.
+"""
+
+import json
+from hashlib import sha256
+
+import frappe
+
+MAX_ENTRIES_PER_PROBLEM = 2000
+QUOTES = {"'": "'", '"': '"', "`": "`", "[": "]"}
+
+
+def get_verdict(
+	problem: str, data_set_hash: str, problem_data, query: str
+) -> tuple[str, str | None] | None:
+	if not (problem and data_set_hash):
+		return None
+
+	cache = frappe.cache()
+	field = get_field(data_set_hash, problem_data, query)
+
+	pipe = cache.pipeline()
+	pipe.hget(verdicts_key(problem), field)
+	# touch the entry, so it is the last to be evicted
+	pipe.zadd(lru_key(problem), {field: frappe.utils.now_datetime().timestamp()}, xx=True)
+	cached, _ = pipe.execute()
+
+	if cached is None:
+		return None
+
+	status, feedback = json.loads(cached)
+	return status, feedback
+
+
+def set_verdict(
+	problem: str, data_set_hash: str, problem_data, query: str, status: str, feedback: str | None
+):
+	if not (problem and data_set_hash):
+		return
+
+	cache = frappe.cache()
+	field = get_field(data_set_hash, problem_data, query)
+
+	pipe = cache.pipeline()
+	pipe.hset(verdicts_key(problem), field, json.dumps([status, feedback]))
+	pipe.zadd(lru_key(problem), {field: frappe.utils.now_datetime().timestamp()})
+	pipe.zcard(lru_key(problem))
+	*_, num_entries = pipe.execute()
+
+	if num_entries > MAX_ENTRIES_PER_PROBLEM:
+		evict(problem, num_entries - MAX_ENTRIES_PER_PROBLEM)
+
+
+def evict(problem: str, count: int):
+	cache = frappe.cache()
+	least_recently_used = cache.zrange(lru_key(problem), 0, count - 1)
+	if not least_recently_used:
+		return
+
+	pipe = cache.pipeline()
+	pipe.hdel(verdicts_key(problem), *least_recently_used)
+	pipe.zrem(lru_key(problem), *least_recently_used)
+	pipe.execute()
+
+
+def invalidate(problem: str):
+	cache = frappe.cache()
+	cache.delete(verdicts_key(problem), lru_key(problem))
+
+
+def verdicts_key(problem: str) -> str:
+	return frappe.cache().make_key(f"ff_sql_verdicts:{problem}")
+
+
+def lru_key(problem: str) -> str:
+	return frappe.cache().make_key(f"ff_sql_verdicts_lru:{problem}")
+
+
+def get_field(data_set_hash: str, problem_data, query: str) -> str:
+	# the reference query is part of the key, so verdicts cached while a problem was
+	# being edited can never be served for its new version
+	key = "\0".join(
+		(
+			data_set_hash,
+			problem_data.correct_query or "",
+			str(int(problem_data.consider_order or 0)),
+			normalize_query(query or ""),
+		)
+	)
+	return sha256(key.encode()).hexdigest()
+
+
+def normalize_query(query: str) -> str:
+	"""Lowercases, collapses whitespace and strips comments and trailing semicolons.
+
+	Quoted strings and identifiers are kept exactly as written.
+	"""
+	out = []
+	i, length = 0, len(query)
+
+	def add_space():
+		if out and out[-1] != " ":
+			out.append(" ")
+
+	while i < length:
+		char = query[i]
+
+		if char in QUOTES:
+			closing = QUOTES[char]
+			end = i + 1
+			while end < length:
+				if query[end] == closing:
+					# a doubled quote is an escaped quote, not the end of the literal
+					if closing != "]" and query[end + 1 : end + 2] == closing:
+						end += 2
+						continue
+					break
+				end += 1
+			out.append(query[i : end + 1])
+			i = end + 1
+
+		elif query.startswith("--", i):
+			end = query.find("\n", i)
+			i = length if end == -1 else end
+			add_space()
+
+		elif query.startswith("/*", i):
+			end = query.find("*/", i + 2)
+			i = length if end == -1 else end + 2
+			add_space()
+
+		elif char.isspace():
+			add_space()
+			i += 1
+
+		else:
+			out.append(char.lower())
+			i += 1
+
+	normalized = "".join(out).strip()
+	while normalized.endswith(";"):
+		normalized = normalized[:-1].rstrip()
+
+	return normalized
@@ -0,0 +1,16 @@
+# Copyright (c) 2023, Hussain Nagaria and Contributors
+# See license.txt
+
+from frappe.tests.utils import FrappeTestCase
+
+from ff_assignment_portal import api
+
+
+class TestAPI(FrappeTestCase):
+	def test_feedback_excerpt_is_plain_text(self):
+		excerpt = api.get_feedback_excerpt("<b>Airline</b> has too few fields<br/>Missing <code>seat</code>")
+		self.assertEqual(excerpt, "Airline has too few fields Missing seat")
+
+		excerpt = api.get_feedback_excerpt("x" * 1000)
+		self.assertEqual(len(excerpt), api.FEEDBACK_EXCERPT_LENGTH)
+		self.assertTrue(excerpt.endswith("…"))
@@ -0,0 +1,31 @@
+# Copyright (c) 2023, Hussain Nagaria and Contributors
+# See license.txt
+
+import tempfile
+import zipfile
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ff_assignment_portal import archive
+
+
+class TestArchive(FrappeTestCase):
+	def test_rejects_zip_bombs_before_reading(self):
+		with tempfile.NamedTemporaryFile(suffix=".zip") as f:
+			with zipfile.ZipFile(f.name, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+				zip_file.writestr("submission/airline.json", " " * (archive.MAX_MEMBER_SIZE - 1))
+
+			with self.assertRaises(frappe.ValidationError):
+				list(archive.iter_members(f.name))
+
+	def test_skips_irrelevant_members(self):
+		with tempfile.NamedTemporaryFile(suffix=".zip") as f:
+			with zipfile.ZipFile(f.name, "w") as zip_file:
+				zip_file.writestr("submission/airline.json", "{}")
+				zip_file.writestr("submission/screenshot.png", b"\x89PNG")
+				zip_file.writestr("__MACOSX/submission/._airline.json", "")
+
+			members = list(archive.iter_members(f.name))
+
+		self.assertEqual(members, [("submission/airline.json", b"{}")])
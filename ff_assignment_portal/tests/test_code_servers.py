@@ -0,0 +1,32 @@
+# Copyright (c) 2023, Hussain Nagaria and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ff_assignment_portal import code_servers
+
+GB = 1024 * 1024  # in KB
+
+
+class TestCodeServers(FrappeTestCase):
+	def test_fails_over_past_hosts_that_are_down(self):
+		suffix = frappe.generate_hash(length=8)
+		small, down, large = (f"{name}-{suffix}.example.com" for name in ("small", "down", "large"))
+		loads = {small: {"free_kb": 10 * GB, "workspaces": 1}, large: {"free_kb": 100 * GB, "workspaces": 1}}
+		for host in (small, down, large):
+			self.addCleanup(frappe.cache().delete_value, f"ff_code_servers:unhealthy:{host}")
+
+		hosts = [frappe._dict(host=host, weight=1) for host in (small, down, large)]
+		with patch.object(code_servers, "get_hosts", return_value=hosts), patch.object(
+			code_servers, "probe", side_effect=loads.get
+		) as probe:
+			self.assertEqual(code_servers.get_candidate_hosts(), [large, small, down])
+			self.assertTrue(code_servers.is_unhealthy(down))
+
+			# skipped without another probe until it has been down for a while
+			probe.reset_mock()
+			self.assertEqual(code_servers.get_candidate_hosts(), [large, small, down])
+			self.assertNotIn(down, [call.args[0] for call in probe.call_args_list])
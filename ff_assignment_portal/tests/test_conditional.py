@@ -0,0 +1,43 @@
+# Copyright (c) 2023, Hussain Nagaria and Contributors
+# See license.txt
+
+from unittest.mock import Mock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from ff_assignment_portal import conditional
+
+
+class TestConditional(FrappeTestCase):
+	def setUp(self):
+		self.resource = f"test:{frappe.generate_hash()}"
+		self.addCleanup(frappe.cache().delete_value, f"ff_version:{self.resource}")
+
+	def test_not_modified_on_matching_etag(self):
+		get_data = Mock(return_value={"day-1": True})
+
+		response = self.get(get_data)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(frappe.parse_json(response.get_data(as_text=True)), {"message": {"day-1": True}})
+		etag, _ = response.get_etag()
+
+		get_data.reset_mock()
+		response = self.get(get_data, etag)
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(response.get_data(), b"")
+		get_data.assert_not_called()
+
+		# the resource changed, the client's copy is stale
+		frappe.cache().delete_value(f"ff_version:{self.resource}")
+		response = self.get(get_data, etag)
+		self.assertEqual(response.status_code, 200)
+		self.assertNotEqual(response.get_etag()[0], etag)
+
+	def get(self, get_data, etag=None):
+		headers = {"If-None-Match": f'"{etag}"'} if etag else {}
+		request = Request(EnvironBuilder(method="GET", headers=headers).get_environ())
+		with patch.object(frappe.local, "request", request, create=True):
+			return conditional.conditional_response(self.resource, get_data)
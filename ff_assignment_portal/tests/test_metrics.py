@@ -0,0 +1,42 @@
+# Copyright (c) 2023, Hussain Nagaria and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ff_assignment_portal import metrics
+
+
+class TestMetrics(FrappeTestCase):
+	def test_flush_and_render(self):
+		day = frappe.generate_hash(length=8)
+		self.addCleanup(self.delete_series, day)
+
+		metrics.inc("ff_checks_total", day=day, status="Passed")
+		metrics.inc("ff_checks_total", 2, day=day, status="Passed")
+		metrics.observe("ff_check_duration_seconds", 0.3, day=day)
+		metrics.flush()
+		# a second flush with nothing buffered does not count anything twice
+		metrics.flush()
+
+		text = metrics.render()
+		self.assertIn("# TYPE ff_checks_total counter", text)
+		self.assertIn(f'ff_checks_total{{day="{day}",status="Passed"}} 3', text)
+		self.assertIn(f'ff_check_duration_seconds_bucket{{day="{day}",le="0.25"}} 0', text)
+		self.assertIn(f'ff_check_duration_seconds_bucket{{day="{day}",le="0.5"}} 1', text)
+		self.assertIn(f'ff_check_duration_seconds_bucket{{day="{day}",le="+Inf"}} 1', text)
+		self.assertIn(f'ff_check_duration_seconds_count{{day="{day}"}} 1', text)
+		self.assertIn(f'ff_check_duration_seconds_sum{{day="{day}"}} 0.3', text)
+
+	def delete_series(self, label_value):
+		cache = frappe.cache()
+		key = cache.make_key(metrics.CACHE_KEY)
+		pipe = cache.pipeline()
+		pipe.hkeys(key)
+		(fields,) = pipe.execute()
+
+		fields = [field for field in fields if label_value in frappe.safe_decode(field)]
+		if fields:
+			pipe = cache.pipeline()
+			pipe.hdel(key, *fields)
+			pipe.execute()
@@ -0,0 +1,25 @@
+# Copyright (c) 2023, Hussain Nagaria and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ff_assignment_portal.rate_limit import take_token
+
+
+class TestRateLimit(FrappeTestCase):
+	def test_token_bucket(self):
+		key = f"ff_rate_limit:test:{frappe.generate_hash()}"
+		self.addCleanup(frappe.cache().delete_value, key)
+		now = 1_000_000.0
+
+		# a full bucket allows `burst` calls at once
+		self.assertEqual([take_token(key, 1, 3, now) for _ in range(4)], [True, True, True, False])
+
+		# and refills at `rate` tokens per second
+		self.assertFalse(take_token(key, 1, 3, now + 0.5))
+		self.assertTrue(take_token(key, 1, 3, now + 1))
+		self.assertFalse(take_token(key, 1, 3, now + 1))
+
+		# never beyond `burst`, however long it was idle
+		self.assertEqual([take_token(key, 1, 3, now + 100) for _ in range(4)], [True, True, True, False])
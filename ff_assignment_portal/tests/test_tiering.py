@@ -0,0 +1,50 @@
+# Copyright (c) 2023, Hussain Nagaria and Contributors
+# See license.txt
+
+import os
+import tempfile
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ff_assignment_portal import tiering
+
+
+class TestTiering(FrappeTestCase):
+	def test_tiered_attachments_are_rehydrated(self):
+		contents = b"submission" * 1000
+		file_urls = [f"/private/files/{frappe.generate_hash()}.zip" for _ in range(2)]
+		paths = {file_url: tiering.get_local_path(file_url) for file_url in file_urls}
+		for path in paths.values():
+			self.addCleanup(lambda path=path: os.path.exists(path) and os.remove(path))
+			with open(path, "wb") as f:
+				f.write(contents)
+
+		with tempfile.TemporaryDirectory() as packs_dir, tiering.use_packs_dir(packs_dir):
+			tiering.pack_files(paths)
+			index = tiering.load_index()
+			self.assertEqual(index.files[file_urls[0]], index.files[file_urls[1]])
+			self.assertFalse(any(os.path.exists(path) for path in paths.values()))
+
+			for file_url, path in paths.items():
+				self.assertTrue(tiering.ensure_on_disk(file_url))
+				with open(path, "rb") as f:
+					self.assertEqual(f.read(), contents)
+
+	def test_only_readers_can_restore(self):
+		file_doc = frappe.get_doc(
+			{
+				"doctype": "File",
+				"file_name": f"{frappe.generate_hash()}.zip",
+				"is_private": 1,
+				"content": b"submission",
+			}
+		).insert()
+		self.addCleanup(os.remove, file_doc.get_full_path())
+		self.addCleanup(frappe.set_user, "Administrator")
+
+		self.assertTrue(tiering.can_read(file_doc.file_url))
+		self.assertFalse(tiering.can_read("/private/files/not-uploaded.zip"))
+
+		frappe.set_user("Guest")
+		self.assertFalse(tiering.can_read(file_doc.file_url))
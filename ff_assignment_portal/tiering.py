@@ -0,0 +1,365 @@
+"""Cold storage for the attachments of old, non-final attempts.
+
+Zips and demo videos of `Stale` and `Failed` attempts are only kept for audit. Once they are
+older than `ff_tiering_age_days` (30 by default, 0 turns tiering off), a daily job moves them
+into pack files under `private/files/_packs`: each blob is addressed by its SHA-256 digest and
+stored once however many URLs share it, compressed unless that does not pay off. Every pack
+has an index next to it mapping the blobs to their offsets and the `File` URLs to their
+blobs. Packs and indexes are written once and never changed, and the index is renamed into
+place last, so a pack without one is an interrupted run and is ignored. The originals are
+only removed after both are on disk.
+
+Nothing changes for readers: the `File` docs and their URLs stay, and a tiered file is put
+back on disk the first time it is asked for, by a request for its URL (see
+`rehydrate_requested_file`) or by `ensure_on_disk`. The next run packs it away again. Packs
+live inside `private/files`, so backups with files carry them instead of every attempt.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import zlib
+from contextlib import suppress
+
+import frappe
+from frappe.utils import add_days, now_datetime
+from redis.exceptions import LockError
+
+from ff_assignment_portal import metrics
+
+ASSIGNMENT_DOCTYPE_NAME = "FF Assignment Submission"
+TIERED_STATUSES = ("Stale", "Failed")
+DEFAULT_AGE_DAYS = 30
+PACKS_DIR = "_packs"
+PRIVATE_FILES_PREFIX = "/private/files/"
+MAX_PACK_SIZE = 1024 * 1024 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
+BATCH_SIZE = 500
+TIERING_LOCK = "ff_tiering"
+
+# parsed indexes by path, a pack never changes once its index exists
+_pack_indexes = {}
+_packs_dir = None
+
+
+def tier_attachments():
+	"""Packs the attachments of old `Stale` and `Failed` attempts. Runs daily from the scheduler."""
+	age_days = frappe.conf.get("ff_tiering_age_days", DEFAULT_AGE_DAYS)
+	if not age_days:
+		return
+
+	cache = frappe.cache()
+	lock = cache.lock(cache.make_key(TIERING_LOCK), timeout=6 * 60 * 60)
+	if not lock.acquire(blocking=False):
+		return
+
+	try:
+		pack_files(get_candidate_paths(add_days(now_datetime(), -age_days)))
+	finally:
+		with suppress(LockError):
+			lock.release()
+
+
+def get_candidate_paths(cutoff) -> dict[str, str]:
+	"""Local paths by URL of the private attachments that only old non-final attempts use"""
+	Submission = frappe.qb.DocType(ASSIGNMENT_DOCTYPE_NAME)
+	rows = (
+		frappe.qb.from_(Submission)
+		.select(Submission.submission, Submission.demo_video)
+		.where(Submission.status.isin(TIERED_STATUSES) & (Submission.creation < cutoff))
+		.run()
+	)
+	file_urls = sorted(
+		{url for row in rows for url in row if url and url.startswith(PRIVATE_FILES_PREFIX)}
+	)
+
+	candidates = {}
+	for start in range(0, len(file_urls), BATCH_SIZE):
+		batch = file_urls[start : start + BATCH_SIZE]
+		# identical uploads share a URL, one that a newer or final attempt uses stays on disk
+		in_use = (
+			frappe.qb.from_(Submission)
+			.select(Submission.submission, Submission.demo_video)
+			.where(Submission.submission.isin(batch) | Submission.demo_video.isin(batch))
+			.where(Submission.status.notin(TIERED_STATUSES) | (Submission.creation >= cutoff))
+			.run()
+		)
+		in_use = {url for row in in_use for url in row}
+
+		for file_url in batch:
+			path = get_local_path(file_url)
+			if file_url not in in_use and path and os.path.exists(path):
+				candidates[file_url] = path
+
+	return candidates
+
+
+def pack_files(paths: dict[str, str]):
+	"""Moves the files at `paths` ({URL: local path}) into packs and removes them from disk"""
+	if not paths:
+		return
+
+	index = load_index()
+	writer = None
+	packed = []
+
+	try:
+		for file_url, path in paths.items():
+			digest = file_digest(path)
+			if index.files.get(file_url) == digest:
+				# packed by an earlier run and rehydrated since
+				packed.append(path)
+				continue
+
+			size = os.path.getsize(path)
+			if writer and writer.blobs and writer.size + size > MAX_PACK_SIZE:
+				packed.extend(writer.commit())
+				writer = None
+				index = load_index()
+
+			writer = writer or PackWriter()
+			if digest in index.blobs or digest in writer.blobs:
+				metrics.inc("ff_tiering_blobs_total", result="deduplicated")
+			else:
+				writer.add_blob(digest, path, size)
+				metrics.inc("ff_tiering_blobs_total", result="packed")
+
+			writer.add_file(file_url, digest, path)
+
+		if writer:
+			packed.extend(writer.commit())
+			writer = None
+	finally:
+		if writer:
+			writer.abort()
+
+	for path in packed:
+		with suppress(FileNotFoundError):
+			os.remove(path)
+
+	metrics.inc("ff_tiering_files_total", len(packed))
+
+
+class PackWriter:
+	"""Appends blobs to a new pack, which only becomes visible with `commit`"""
+
+	def __init__(self):
+		self.name = f"{now_datetime():%Y%m%d%H%M%S}-{frappe.generate_hash(length=8)}"
+		self.pack_path = get_pack_path(self.name)
+		self.file = open(f"{self.pack_path}.tmp", "wb")
+		self.size = 0
+		self.blobs = {}
+		self.files = {}
+		self.paths = []
+
+	def add_blob(self, digest: str, path: str, size: int):
+		offset = self.size
+		compressor = zlib.compressobj()
+		with open(path, "rb") as f:
+			while chunk := f.read(READ_CHUNK_SIZE):
+				self.file.write(compressor.compress(chunk))
+		self.file.write(compressor.flush())
+		length, codec = self.file.tell() - offset, "zlib"
+
+		if length >= size:
+			# zips and videos are mostly compressed already, keep those as they are
+			self.file.seek(offset)
+			self.file.truncate()
+			with open(path, "rb") as f:
+				shutil.copyfileobj(f, self.file, READ_CHUNK_SIZE)
+			length, codec = size, "raw"
+
+		self.size = offset + length
+		self.blobs[digest] = [offset, length, size, codec]
+		metrics.inc("ff_tiering_bytes_total", size, kind="original")
+		metrics.inc("ff_tiering_bytes_total", length, kind="packed")
+
+	def add_file(self, file_url: str, digest: str, path: str):
+		self.files[file_url] = digest
+		self.paths.append(path)
+
+	def commit(self) -> list[str]:
+		"""Makes the pack durable and visible, returns the paths that can be removed now"""
+		self.file.flush()
+		os.fsync(self.file.fileno())
+		self.file.close()
+		os.rename(f"{self.pack_path}.tmp", self.pack_path)
+
+		index_path = get_index_path(self.name)
+		with open(f"{index_path}.tmp", "w") as f:
+			json.dump({"blobs": self.blobs, "files": self.files}, f)
+			f.flush()
+			os.fsync(f.fileno())
+		os.rename(f"{index_path}.tmp", index_path)
+		fsync_dir(get_packs_dir())
+
+		return self.paths
+
+	def abort(self):
+		self.file.close()
+		with suppress(FileNotFoundError):
+			os.remove(f"{self.pack_path}.tmp")
+
+
+def load_index() -> frappe._dict:
+	"""Blob locations (pack, offset, length, size, codec) by digest and digests by URL, of every pack"""
+	index = frappe._dict(blobs={}, files={})
+	packs_dir = get_packs_dir()
+
+	# later packs win, a URL tiered again after its file changed points at the newest blob
+	for file_name in sorted(os.listdir(packs_dir)):
+		if not file_name.endswith(".idx"):
+			continue
+
+		index_path = os.path.join(packs_dir, file_name)
+		if index_path not in _pack_indexes:
+			with open(index_path) as f:
+				_pack_indexes[index_path] = json.load(f)
+
+		pack_index = _pack_indexes[index_path]
+		name = file_name.removesuffix(".idx")
+		for digest, location in pack_index["blobs"].items():
+			index.blobs[digest] = (name, *location)
+		index.files.update(pack_index["files"])
+
+	return index
+
+
+def rehydrate_requested_file():
+	"""`before_request` hook, puts a tiered private file back before Frappe serves it"""
+	request = getattr(frappe.local, "request", None)
+	if not request or not request.path.startswith(PRIVATE_FILES_PREFIX):
+		return
+
+	# only users who may download the file get to restore it, the check Frappe makes before
+	# serving it: a URL attached to several documents is readable through any of its `File` docs
+	if frappe.session.user == "Guest" or not can_read(request.path):
+		return
+
+	ensure_on_disk(request.path)
+
+
+def can_read(file_url: str) -> bool:
+	return any(
+		frappe.has_permission("File", "read", doc=name)
+		for name in frappe.get_all("File", filters={"file_url": file_url}, pluck="name")
+	)
+
+
+def ensure_on_disk(file_url: str) -> bool:
+	"""Restores the private file at `file_url` from its pack if it was tiered.
+
+	Returns False if the file is neither on disk nor in a pack.
+	"""
+	path = get_local_path(file_url)
+	if not path:
+		return False
+
+	return os.path.exists(path) or rehydrate(file_url, path)
+
+
+def rehydrate(file_url: str, path: str) -> bool:
+	index = load_index()
+	digest = index.files.get(file_url)
+	if not digest:
+		return False
+
+	pack, offset, length, size, codec = index.blobs[digest]
+	decompressor = zlib.decompressobj() if codec == "zlib" else None
+	sha256 = hashlib.sha256()
+	# written next to the original and renamed, so concurrent requests never see half a file
+	tmp_path = f"{path}.{frappe.generate_hash(length=8)}.tmp"
+
+	try:
+		with open(get_pack_path(pack), "rb") as pack_file, open(tmp_path, "wb") as out:
+			pack_file.seek(offset)
+			remaining = length
+			while remaining and (chunk := pack_file.read(min(READ_CHUNK_SIZE, remaining))):
+				remaining -= len(chunk)
+				if decompressor:
+					chunk = decompressor.decompress(chunk)
+				sha256.update(chunk)
+				out.write(chunk)
+
+			if decompressor:
+				chunk = decompressor.flush()
+				sha256.update(chunk)
+				out.write(chunk)
+
+			written = out.tell()
+
+		if sha256.hexdigest() != digest or written != size:
+			frappe.log_error(f"Pack {pack} holds a corrupt copy of {file_url}", reference_doctype="File")
+			return False
+
+		os.replace(tmp_path, path)
+	finally:
+		with suppress(FileNotFoundError):
+			os.remove(tmp_path)
+
+	metrics.inc("ff_tiering_rehydrations_total")
+	return True
+
+
+def file_digest(path: str) -> str:
+	sha256 = hashlib.sha256()
+	with open(path, "rb") as f:
+		while chunk := f.read(READ_CHUNK_SIZE):
+			sha256.update(chunk)
+
+	return sha256.hexdigest()
+
+
+def fsync_dir(path: str):
+	fd = os.open(path, os.O_RDONLY)
+	try:
+		os.fsync(fd)
+	finally:
+		os.close(fd)
+
+
+def get_local_path(file_url: str | None) -> str | None:
+	"""Path of the private file at `file_url`, None for anything else"""
+	if not file_url or not file_url.startswith(PRIVATE_FILES_PREFIX):
+		return None
+
+	files_dir = os.path.abspath(frappe.get_site_path("private", "files"))
+	path = os.path.abspath(os.path.join(files_dir, file_url.removeprefix(PRIVATE_FILES_PREFIX)))
+	if not path.startswith(files_dir + os.sep) or path.startswith(get_packs_dir() + os.sep):
+		return None
+
+	return path
+
+
+def get_pack_path(name: str) -> str:
+	return os.path.join(get_packs_dir(), f"{name}.pack")
+
+
+def get_index_path(name: str) -> str:
+	return os.path.join(get_packs_dir(), f"{name}.idx")
+
+
+class use_packs_dir:
+	"""Points the packs at another directory for the duration, used by the tests"""
+
+	def __init__(self, packs_dir: str):
+		self.packs_dir = packs_dir
+
+	def __enter__(self):
+		global _packs_dir
+		self.previous, _packs_dir = _packs_dir, self.packs_dir
+
+	def __exit__(self, *args):
+		global _packs_dir
+		_packs_dir = self.previous
+		# forget the indexes of packs that only existed for the duration
+		for index_path in list(_pack_indexes):
+			if index_path.startswith(os.path.abspath(self.packs_dir) + os.sep):
+				del _pack_indexes[index_path]
+
+
+def get_packs_dir() -> str:
+	packs_dir = os.path.abspath(_packs_dir or frappe.get_site_path("private", "files", PACKS_DIR))
+	os.makedirs(packs_dir, exist_ok=True)
+	return packs_dir
@@ -2,25 +2,36 @@ import io
 import frappe
 import paramiko
 
-def get_ssh_client(private_key: str):
+from functools import lru_cache
+
+
+def get_ssh_client(private_key: str, host: str | None = None, timeout: float | None = None):
     settings = frappe.get_cached_doc("Assignment Portal Settings")
 
     username = "root"
-    code_server_host = settings.code_server_host
+    code_server_host = host or settings.code_server_host
+    private_key = load_private_key(private_key, settings.private_key_type)
+
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(
+        code_server_host, username=username, pkey=private_key, timeout=timeout
+    )
+
+    return client
+
+
+@lru_cache(maxsize=8)
+def load_private_key(private_key: str, private_key_type: str) -> paramiko.PKey:
+    # parsing is slow (RSA especially) and the key only changes with the site config
     private_key_string = private_key.replace("\\n", "\n")
 
     key_class = None
-    if settings.private_key_type == "rsa":
+    if private_key_type == "rsa":
         key_class = paramiko.RSAKey
-    elif settings.private_key_type == "ed25519":
+    elif private_key_type == "ed25519":
         key_class = paramiko.Ed25519Key
     else:
         frappe.throw("Invalid key type")
 
-    private_key = key_class.from_private_key(io.StringIO(private_key_string))
-
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    client.connect(code_server_host, username=username, pkey=private_key)
-
-    return client
+    return key_class.from_private_key(io.StringIO(private_key_string))
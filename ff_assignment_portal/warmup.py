@@ -0,0 +1,119 @@
+"""Warm-up of the shared state that checking and grading would otherwise load on first use.
+
+The first check or grade after a deploy pays for loading `Assignment Portal Settings` and
+DocType meta, resolving datasets through `File` docs (converting them for DuckDB) and running
+reference queries. All of that lands in Redis or on disk, shared by every web and background
+worker of the site, so `warm_up` loads it once, in a background job enqueued after a migrate
+and after a full cache clear. Nothing is warmed up on a live request: state that is local to a
+process, like the parsed SSH key and the sandboxed grader processes, is still loaded on first
+use.
+"""
+
+import time
+
+import frappe
+
+from ff_assignment_portal import metrics
+
+WARM_UP_DOCTYPES = (
+	"Assignment Portal Settings",
+	"FF Assignment Submission",
+	"SQL Problem Set",
+	"SQL Problem",
+	"SQL Problem Solution",
+)
+
+
+def after_migrate():
+	# `frappe.enqueue` runs jobs right away during a migrate, so this is done before the deploy is live
+	enqueue_warm_up("migrate")
+	metrics.flush()
+
+
+def after_clear_cache():
+	# a migrate clears the cache before the schema is synced, `after_migrate` warms up instead
+	if frappe.flags.in_migrate or frappe.flags.in_install:
+		return
+
+	enqueue_warm_up("clear_cache")
+
+
+def enqueue_warm_up(trigger: str):
+	if not frappe.conf.get("ff_warm_up", 1):
+		return
+
+	frappe.enqueue(
+		"ff_assignment_portal.warmup.warm_up",
+		trigger=trigger,
+		job_id="ff_warm_up",
+		deduplicate=True,
+	)
+
+
+def warm_up(trigger: str) -> dict[str, float]:
+	"""Runs the warm-up steps and returns how long each took, in seconds"""
+	durations = {}
+	for step in (load_settings, load_meta, load_data_sets):
+		started = time.perf_counter()
+		try:
+			step()
+		except Exception:
+			# a failed step only means that state gets loaded on first use, as before
+			frappe.logger("ff_assignment_portal").exception(f"Warm-up step {step.__name__} failed")
+		durations[step.__name__] = time.perf_counter() - started
+
+	total = sum(durations.values())
+	metrics.observe("ff_warm_up_duration_seconds", total, trigger=trigger)
+	frappe.logger("ff_assignment_portal").info(
+		f"Warmed up in {total:.3f}s on {trigger}: "
+		+ ", ".join(f"{name} {duration:.3f}s" for name, duration in durations.items())
+	)
+	return durations
+
+
+def load_settings():
+	frappe.get_cached_doc("Assignment Portal Settings")
+
+
+def load_meta():
+	from frappe.model.base_document import get_controller
+
+	for doctype in WARM_UP_DOCTYPES:
+		frappe.get_meta(doctype)
+		# imports the controller module, with all the check rules
+		get_controller(doctype)
+
+
+def load_data_sets():
+	"""Resolves every problem set's dataset (converting it for DuckDB) and caches the output
+	of its reference queries"""
+	from ff_assignment_portal.sql_portal import grader
+
+	for data_set_path, engine, data_set_hash, problem_set in get_data_sets():
+		for correct_query in frappe.get_all(
+			"SQL Problem", filters={"problem_set": problem_set}, pluck="correct_query"
+		):
+			try:
+				grader.get_correct_output(data_set_path, correct_query, engine, data_set_hash)
+			except grader.get_engine_errors():
+				# a broken reference query shows up when the problem is solved, not here
+				continue
+
+
+def get_data_sets() -> list[tuple[str, str, str | None, str]]:
+	"""(path, engine, content hash, problem set) of the dataset of every problem set"""
+	from ff_assignment_portal.sql_portal import grader
+
+	data_sets = []
+	for problem_set in frappe.get_all("SQL Problem Set", filters={"data_set": ("is", "set")}, pluck="name"):
+		try:
+			data_set_path = grader.get_data_set_path(problem_set)
+		except Exception:
+			frappe.logger("ff_assignment_portal").exception(f"Unable to load the dataset of {problem_set}")
+			continue
+
+		data_sets.append(
+			(data_set_path, grader.get_engine(problem_set), grader.get_data_set_hash(problem_set), problem_set)
+		)
+
+	return data_sets